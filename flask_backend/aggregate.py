@@ -0,0 +1,181 @@
+import json
+
+import numpy as np
+import pandas as pd
+from pandas.api import types
+
+AGGREGATIONS = {"count", "sum", "mean", "min", "max"}
+MAX_BINS = 1000
+# Period aliases per bucket size; newer pandas spells hours 'h', older 'H'
+TIME_BUCKETS = {
+    "minute": ("min",),
+    "hour": ("h", "H"),
+    "day": ("D",),
+    "week": ("W",),
+    "month": ("M",),
+    "quarter": ("Q",),
+    "year": ("Y",),
+}
+
+
+class AggregateError(ValueError):
+    """An aggregation spec that can't be computed on the dataset"""
+
+
+def spec_key(spec):
+    """Canonical text of a spec, for memoizing results"""
+    return json.dumps(spec, sort_keys=True, default=str)
+
+
+def aggregate(df, spec):
+    """Compute a chart-ready summary of df described by spec"""
+    kind = spec.get("type", "groupby")
+    if kind == "groupby":
+        return group_by(df, spec)
+    if kind == "histogram":
+        return histogram(df, spec)
+    if kind == "timeseries":
+        return time_buckets(df, spec)
+    raise AggregateError(f"Unknown aggregate type: {kind}")
+
+
+def column(df, name):
+    name = str(name).lower()  # process_dataframe lowercases columns
+    if name not in df.columns:
+        raise AggregateError(f"Unknown column: {name}")
+    return name
+
+
+def integer(spec, name, default=None, low=None, high=None):
+    """An integer field of spec within [low, high], or default when absent or null"""
+    value = spec.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise AggregateError(f"{name} must be an integer")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise AggregateError(f"{name} must be an integer")
+    if (low is not None and value < low) or (high is not None and value > high):
+        bounds = f"between {low} and {high}" if high is not None else f"at least {low}"
+        raise AggregateError(f"{name} must be {bounds}")
+    return value
+
+
+def value_range(spec):
+    """The [low, high] range of a histogram as a tuple, or None"""
+    bounds = spec.get("range")
+    if bounds is None:
+        return None
+    if (not isinstance(bounds, list) or len(bounds) != 2
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in bounds)
+            or not np.isfinite(bounds).all() or bounds[0] >= bounds[1]):
+        raise AggregateError("range must be [low, high] with low below high")
+    return tuple(bounds)
+
+
+def parse_metrics(df, metrics):
+    """[{"column", "agg"}] -> [(output name, column, agg)], count is always included"""
+    if metrics is None:
+        return []
+    if not isinstance(metrics, list) or not all(isinstance(m, dict) for m in metrics):
+        raise AggregateError('metrics must be a list of {"column", "agg"} objects')
+    parsed = []
+    for metric in metrics:
+        agg = metric.get("agg", "count")
+        if not isinstance(agg, str) or agg not in AGGREGATIONS:
+            raise AggregateError(f"Unknown aggregation: {agg}")
+        if agg == "count":
+            continue
+        col = column(df, metric.get("column"))
+        if agg in ("sum", "mean") and not types.is_numeric_dtype(df[col].dtype):
+            raise AggregateError(f"Column {col} is not numeric, can't {agg} it")
+        parsed.append((f"{col}_{agg}", col, agg))
+    return parsed
+
+
+def grouped_metrics(df, keys, metrics):
+    """Group df by keys and compute count plus the requested metrics"""
+    grouped = df.groupby(keys, observed=True, sort=True)
+    result = grouped.size().rename("count").to_frame()
+    for name, col, agg in metrics:
+        try:
+            result[name] = grouped[col].agg(agg)
+        except TypeError:
+            raise AggregateError(f"Can't {agg} column {col}")
+    return result.reset_index()
+
+
+def order_and_limit(result, spec):
+    sort = spec.get("sort")
+    if sort:
+        if not isinstance(sort, str) or sort not in result.columns:
+            raise AggregateError(f"Can't sort by {sort}")
+        result = result.sort_values(sort, ascending=spec.get("order", "desc") == "asc",
+                                    kind="mergesort")
+    limit = integer(spec, "limit", low=0)
+    if limit is not None:
+        result = result.head(limit)
+    return result
+
+
+def group_by(df, spec):
+    by = spec.get("by")
+    if not by:
+        raise AggregateError("groupby needs 'by'")
+    keys = [column(df, name) for name in (by if isinstance(by, list) else [by])]
+    result = grouped_metrics(df, keys, parse_metrics(df, spec.get("metrics")))
+    result = order_and_limit(result, spec)
+    return {"groups": result.to_dict(orient="records"), "total_groups": len(result)}
+
+
+def histogram(df, spec):
+    col = column(df, spec.get("column"))
+    if not types.is_numeric_dtype(df[col].dtype) or types.is_bool_dtype(df[col].dtype):
+        raise AggregateError(f"Column {col} is not numeric")
+    bins = integer(spec, "bins", 20, low=1, high=MAX_BINS)
+    bounds = value_range(spec)
+
+    values = df[col].to_numpy(dtype=np.float64)
+    present = values[~np.isnan(values)]
+    if not len(present) and bounds is None:
+        return {"edges": [], "counts": [], "missing": int(len(values))}
+    counts, edges = np.histogram(present, bins=bins, range=bounds)
+    return {
+        "edges": edges.tolist(),
+        "counts": counts.tolist(),
+        "missing": int(len(values) - len(present))
+    }
+
+
+def time_buckets(df, spec):
+    col = column(df, spec.get("column"))
+    every = spec.get("every", "day")
+    if not isinstance(every, str) or every not in TIME_BUCKETS:
+        raise AggregateError(f"every must be one of {', '.join(TIME_BUCKETS)}")
+
+    times = df[col]
+    if not types.is_datetime64_any_dtype(times.dtype):
+        # pandas 2 infers one format from the first value unless told otherwise
+        options = {"format": "mixed"} if int(pd.__version__.split(".")[0]) >= 2 else {}
+        times = pd.to_datetime(times, errors="coerce", **options)
+    if getattr(times.dt, "tz", None) is not None:
+        times = times.dt.tz_localize(None)
+    buckets = None
+    for alias in TIME_BUCKETS[every]:
+        try:
+            buckets = times.dt.to_period(alias).dt.start_time
+            break
+        except ValueError:
+            continue
+    if buckets is None:
+        raise AggregateError(f"This pandas version can't bucket by {every}")
+
+    metrics = parse_metrics(df, spec.get("metrics"))
+    columns = list(dict.fromkeys(col for _, col, _ in metrics))
+    frame = df[columns].assign(bucket=buckets)
+    result = grouped_metrics(frame, ["bucket"], metrics)
+    result["bucket"] = result["bucket"].dt.strftime("%Y-%m-%dT%H:%M:%S")
+    result = order_and_limit(result, spec)
+    return {"buckets": result.to_dict(orient="records"), "unparsed": int(buckets.isna().sum())}
@@ -1,15 +1,36 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context, json, g
 from werkzeug.utils import secure_filename
-import pandas as pd
+import numpy as np
 import os
+import stat
+import hashlib
+import time
 import uuid
+import threading
+import cProfile
+import io
+import pstats
+from concurrent.futures import ThreadPoolExecutor
 from flask_cors import CORS
+from dataset_store import DatasetStore, records, iter_records, select, sort_positions, missing_columns
+from search_index import SearchIndex, narrowest_cached
+from query import build_mask, QueryError
+from content_store import ContentStore, FileHashes
+from ingest import load_dataset, iter_csv_chunks, compact_dtypes, excel_sheet_names
+from jobs import JobQueue, QueueFull, PENDING
+from aggregate import aggregate, spec_key, AggregateError
+from lru import LRUCache
+from thumbnails import ThumbnailCache, THUMBNAIL_ERRORS, parse_size, parse_frames
+from wire_format import ARROW_STREAM_MIMETYPE, arrow_batches
+from status_files import StatusFiles
+from image_batch import BatchError, multipart_files, zip_files, parse_manifest, manifest_rows, write_image, names_content
+from metrics import Registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, SIZE_BUCKETS
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
 # File settings
-MAX_FILE_SIZE = 16 * 1024 * 1024  # 16MB
+MAX_FILE_SIZE = 1024 * 1024 * 1024  # 1GB, large CSVs are ingested in chunks
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 
 # Setup folders
@@ -22,44 +43,327 @@ os.makedirs(IMAGE_FOLDER, exist_ok=True)
 ALLOWED_FILES = {".csv", ".xlsx"}
 ALLOWED_IMAGES = {".jpeg", ".png", ".gif", ".jpg"}
 
-# Store uploaded data in memory
-data_storage = {}
+# Bump whenever process_dataframe output changes, so cached results aren't reused
+PROCESSING_VERSION = 3
+
+# Streaming ingest settings
+STREAM_THRESHOLD = 32 * 1024 * 1024  # CSVs bigger than 32MB are read in chunks
+CSV_CHUNK_ROWS = 50000
+
+# Background processing settings
+PROCESS_WORKERS = int(os.environ.get("PROCESS_WORKERS", os.cpu_count() or 1))
+MAX_PENDING_JOBS = int(os.environ.get("MAX_PENDING_JOBS", 32))  # Queue depth before /process refuses work
+JOB_TIMEOUT = int(os.environ.get("JOB_TIMEOUT", 300))  # Seconds before a job is reported as timed out
+MAX_JOB_WAIT = 30  # Longest a request may block waiting for a job
+
+# Memoized /aggregate results kept per dataset
+AGGREGATE_CACHE_SIZE = 64
+
+# Recent /search matches kept per dataset, refined as a query grows
+SEARCH_CACHE_SIZE = 32
+
+# Pagination settings
+MAX_PAGE_SIZE = 5000
+STREAM_BATCH_SIZE = 500
+
+# Dataset store settings
+DATASET_FOLDER = os.path.join(UPLOAD_FOLDER, "datasets")
+DATASET_MEMORY_BUDGET = int(os.environ.get("DATASET_MEMORY_BUDGET", 512 * 1024 * 1024))  # 512MB per process
+DATASET_TTL = int(os.environ.get("DATASET_TTL", 60 * 60))  # Seconds idle before spilling to disk
+DATASET_DISK_BUDGET = int(os.environ.get("DATASET_DISK_BUDGET", 20 * 1024 ** 3))  # 20GB of files
+DATASET_RETENTION = int(os.environ.get("DATASET_RETENTION", 30 * 24 * 60 * 60))  # Seconds unused before deletion
+INGEST_RETENTION = 60 * 60  # Seconds a finished chunked ingest's progress is kept
+# Share datasets and job progress between server processes (set by wsgi.py)
+SHARED_STATE = os.environ.get("SHARED_STATE", "0") == "1"
+SHARED_POLL_INTERVAL = 0.25  # Seconds between checks when waiting on another process
+
+# Store processed datasets in memory, as columnar frames, backed by a
+# catalog on disk so they survive restarts
+data_storage = DatasetStore(
+    spill_dir=DATASET_FOLDER,
+    memory_budget=DATASET_MEMORY_BUDGET,
+    ttl=DATASET_TTL,
+    shared=SHARED_STATE,
+    persistent=True,
+    disk_budget=DATASET_DISK_BUDGET,
+    retention=DATASET_RETENTION
+)
+# Job and ingest progress for requests landing on another process
+shared_status = StatusFiles(os.path.join(UPLOAD_FOLDER, "status")) if SHARED_STATE else None
+
+# Image caching settings
+IMAGE_MIMETYPES = {".png": "image/png", ".gif": "image/gif"}  # Anything else is served as JPEG
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # Uploads are named by content, so never change
+THUMBNAIL_DISK_BUDGET = int(os.environ.get("THUMBNAIL_DISK_BUDGET", 256 * 1024 * 1024))  # 256MB shared
+
+# Batch image upload settings
+MAX_BATCH_IMAGES = 1000
+MAX_IMAGE_SIZE = 50 * 1024 * 1024  # 50MB per image inside a zip
+IMAGE_WRITE_WORKERS = 8
+
+# Writes the images of a batch upload concurrently
+image_writer = ThreadPoolExecutor(max_workers=IMAGE_WRITE_WORKERS)
+
+# Instrumentation settings
+PROFILING = os.environ.get("PROFILING", "0") == "1"  # Allow ?profile=1 on any request
+PROFILE_LINES = 40  # Functions listed in a ?profile=1 summary
+
+# Per-process metrics, exposed on /metrics in the Prometheus text format
+metrics = Registry()
+request_seconds = metrics.histogram(
+    "http_request_duration_seconds", "Time from receiving a request to sending its last byte",
+    ("method", "route", "status"))
+phase_seconds = metrics.histogram(
+    "request_phase_duration_seconds", "Time spent in each phase of a request or background ingest",
+    ("route", "phase"))
+response_bytes = metrics.histogram(
+    "http_response_size_bytes", "Body bytes sent per response", ("route",), SIZE_BUCKETS)
+cache_lookups = metrics.counter(
+    "cache_lookups_total", "Lookups in the processed, search, sorted search and aggregate caches",
+    ("cache", "result"))
+store_events = metrics.counter(
+    "dataset_store_events_total", "Dataset store hits, misses, evictions, spills and reloads",
+    ("event",))
+store_datasets = metrics.gauge(
+    "dataset_store_datasets", "Datasets known to the store, by where they live", ("state",))
+store_bytes = metrics.gauge(
+    "dataset_store_resident_bytes", "Memory held by resident frames and their derived values")
+store_budget = metrics.gauge(
+    "dataset_store_memory_budget_bytes", "Resident bytes above which datasets are spilled")
+pending_jobs = metrics.gauge("process_jobs_pending", "Jobs queued or running on the process pool")
+
+# Resized images for ?w=&h= / ?preset= requests
+thumbnails = ThumbnailCache(os.path.join(IMAGE_FOLDER, ".thumbnails"),
+                            disk_budget=THUMBNAIL_DISK_BUDGET)
+# Content hashes of served images, used as strong ETags
+image_hashes = FileHashes()
+
+# Uploads are stored once per content hash, processed datasets cached by it
+uploads = ContentStore(UPLOAD_FOLDER, os.path.join(UPLOAD_FOLDER, "blobs"))
+processed_cache = {}  # (content hash, PROCESSING_VERSION[, sheet name]) -> {"file_id", "preview"}
+
+def remember_processed(catalog_records):
+    """Make catalogued datasets reusable for uploads of the same content"""
+    for record in catalog_records:
+        if record.get("cache_key"):
+            processed_cache[tuple(record["cache_key"])] = {"file_id": record["file_id"],
+                                                           "preview": record.get("preview")}
+
+# Datasets past retention or the disk budget, and files a crash left behind,
+# are deleted before the catalog is used
+data_storage.sweep()
+remember_processed(data_storage.catalog())
+
+# Parsing runs on a process pool so it doesn't block request workers
+process_jobs = JobQueue(
+    max_workers=PROCESS_WORKERS,
+    max_pending=MAX_PENDING_JOBS,
+    timeout=JOB_TIMEOUT,
+    on_change=lambda job: publish_status(f"job-{job.id}", job_body(job))
+)
+
+# Progress of chunked ingests, file_id -> {"rows", "done", "error", "started", "finished"}
+ingest_status = {}
 
 def is_valid_file(filename, allowed_types):
     """Check if file has an allowed extension"""
     return os.path.splitext(filename)[1].lower() in allowed_types
 
-def find_image_column(df):
-    """Find column that might contain image URLs"""
-    for col in df.columns:
-        if any(word in col.lower() for word in ['image', 'url', 'img']):
-            return col
-    return None
-
-def format_image_url(url):
-    """Format image URL to ensure proper structure"""
-    if not url or not isinstance(url, str):
-        return url
-    if url.startswith(('http://', 'https://')):
-        return url
-    return f"http://127.0.0.1:5000/get_image/{url.split('/')[-1]}"
-
-def process_dataframe(df):
-    """Process dataframe to standardize column names and handle image URLs"""
-    # Convert columns to lowercase
-    df.columns = df.columns.str.lower()
-    
-    # Handle image column
-    image_col = find_image_column(df)
-    if image_col:
-        df.rename(columns={image_col: 'image_url'}, inplace=True)
-        df['image_url'] = df['image_url'].apply(format_image_url)
+def is_valid_file_id(file_id):
+    """Whether file_id has the form /process issues, so it is safe in a filename"""
+    try:
+        return str(uuid.UUID(file_id)) == file_id
+    except (TypeError, ValueError):
+        return False
+
+def parse_page_args(args):
+    """Read offset/limit query parameters, raising ValueError on bad input"""
+    offset, limit = args.get('offset', 0), args.get('limit')
+    try:
+        # JSON bodies can hold null, lists or objects where a number belongs
+        offset = int(offset if offset is not None else 0)
+        limit = int(limit) if limit is not None else None
+    except TypeError:
+        raise ValueError("offset and limit must be integers")
+    if offset < 0 or (limit is not None and limit <= 0):
+        raise ValueError("offset must be >= 0 and limit must be > 0")
+    if limit is not None:
+        limit = min(limit, MAX_PAGE_SIZE)
+    return offset, limit
+
+def parse_sort_args(args, df):
+    """Read the sort column and order, raising ValueError for unknown columns"""
+    column = args.get('sort')
+    if not column:
+        return None, False
+    column = str(column).lower()
+    if column not in df.columns:
+        raise ValueError(f"Unknown sort column: {column}")
+    return column, str(args.get('order', 'asc')).lower() == 'desc'
+
+def sorted_rows(file_id, column, descending):
+    """Every row position of a dataset ordered by column, sorted once and cached
+
+    The permutation is a derived value, so it is dropped with the frame
+    and re-sorted only after the data changes.
+    """
+    with phase("sort"):
+        return data_storage.derived(file_id, ("sorted", column, descending),
+                                    lambda df: sort_positions(df, column, descending))
+
+def sorted_subset(file_id, size, positions, column, descending):
+    """positions (e.g. search matches) in the dataset's cached column order"""
+    order = sorted_rows(file_id, column, descending)
+    keep = np.zeros(size, dtype=bool)
+    keep[positions] = True
+    return order[keep[order]]
+
+def parse_columns_arg(args):
+    """Read the comma separated columns projection, if any"""
+    columns = args.get('columns')
+    if not columns:
+        return None
+    return [col.strip().lower() for col in columns.split(',') if col.strip()]
+
+def stream_json_rows(rows, key, meta):
+    """Yield a JSON object with rows under `key`, a batch at a time"""
+    yield json.dumps(meta)[:-1] + (', ' if meta else '') + f'"{key}": ['
+    batch = []
+    first = True
+    for row in rows:
+        batch.append(json.dumps(row))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield ('' if first else ', ') + ', '.join(batch)
+            first = False
+            batch = []
+    if batch:
+        yield ('' if first else ', ') + ', '.join(batch)
+    yield ']}'
+
+def stream_ndjson_rows(rows):
+    """Yield one JSON document per line"""
+    batch = []
+    for row in rows:
+        batch.append(json.dumps(row))
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield '\n'.join(batch) + '\n'
+            batch = []
+    if batch:
+        yield '\n'.join(batch) + '\n'
+
+def wants_arrow():
+    """Whether the Accept header prefers an Arrow IPC stream to JSON"""
+    best = request.accept_mimetypes.best_match(["application/json", ARROW_STREAM_MIMETYPE])
+    return best == ARROW_STREAM_MIMETYPE
+
+def page_response(df, positions, key, offset, limit, columns=None, ndjson=False):
+    """Stream one page of rows at the given positions, with paging metadata
+
+    Clients that accept application/vnd.apache.arrow.stream get the page
+    columnar, with the paging metadata in the Arrow schema metadata.
+    """
+    total = len(positions)
+    end = total if limit is None else min(offset + limit, total)
+    meta = {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "next_offset": end if end < total else None
+    }
+
+    if wants_arrow():
+        try:
+            batches = arrow_batches(select(df, positions[offset:end], columns), meta,
+                                    STREAM_BATCH_SIZE)
+        except (TypeError, ValueError):
+            pass  # Columns Arrow can't represent (e.g. mixed types) fall back to JSON
+        else:
+            response = Response(stream_with_context(batches), mimetype=ARROW_STREAM_MIMETYPE)
+            response.vary.add('Accept')
+            return response
+
+    rows = iter_records(df, positions[offset:end], columns, STREAM_BATCH_SIZE)
+
+    # NDJSON streaming mode, one row per line
+    if ndjson:
+        return Response(stream_with_context(stream_ndjson_rows(rows)),
+                        mimetype='application/x-ndjson')
+
+    response = Response(stream_with_context(stream_json_rows(rows, key, meta)),
+                        mimetype='application/json')
+    response.vary.add('Accept')
+    return response
+
+def request_route():
+    """The matched URL rule, so /get_data/<file_id> is one series rather than one per id"""
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+def phase(name, route=None):
+    """Time a named phase of the current request, or of route's background work"""
+    return phase_seconds.time(route=route or request_route(), phase=name)
+
+def metered(body, route, labels, started):
+    """Pass a streamed body through, timing its generation and counting its bytes
+
+    Streamed pages are serialized while the server sends them, after the
+    view returned, so their latency is only known once the last chunk is out.
+    """
+    iterator = iter(body)
+    sent = 0
+    serialize = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                serialize += time.perf_counter() - start
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            sent += len(chunk)
+            yield chunk
+    finally:
+        if hasattr(body, "close"):
+            body.close()
+        phase_seconds.observe(serialize, route=route, phase="serialize")
+        response_bytes.observe(sent, route=route)
+        request_seconds.observe(time.perf_counter() - started, **labels)
+
+def profile_response(profiler, response):
+    """Replace response with a cProfile summary of the request, body generation included"""
+    # Generate the body inside the profile too, the way the server would:
+    # get_data refuses send_file's passthrough bodies, and a 304 sends none
+    size = sum(len(chunk) for chunk in response.get_app_iter(request.environ))
+    response.close()
+    profiler.disable()
+    out = io.StringIO()
+    out.write(f"{request.method} {request.full_path} -> {response.status}, {size} bytes\n")
+    pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_LINES)
+    return Response(out.getvalue(), mimetype="text/plain")
+
+@app.before_request
+def start_request():
+    g.started = time.perf_counter()
+    if PROFILING and request.args.get("profile") == "1":
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        return profile_response(profiler, response)
+
+    route = request_route()
+    labels = {"method": request.method, "route": route, "status": response.status_code}
+    if response.is_streamed and not response.direct_passthrough:
+        response.response = metered(response.response, route, labels, g.started)
     else:
-        # Add sample images if no image column exists
-        df['image_url'] = [f"http://127.0.0.1:5000/get_image/sample{(i % 5) + 1}.jpg" 
-                          for i in range(len(df))]
-    
-    return df
+        response_bytes.observe(response.content_length or 0, route=route)
+        request_seconds.observe(time.perf_counter() - g.started, **labels)
+    return response
 
 @app.route('/')
 def home():
@@ -79,15 +383,30 @@ def upload_file():
     if not is_valid_file(file.filename, ALLOWED_FILES):
         return jsonify({"error": "Invalid file type. Please upload CSV or Excel file"}), 400
 
-    # Save file safely
+    # Save file safely, hashing it as it streams in
     filename = secure_filename(file.filename)
-    file.save(os.path.join(UPLOAD_FOLDER, filename))
+    content_hash, duplicate = uploads.save(file.stream, filename)
     
     return jsonify({
         "message": "File uploaded successfully",
-        "filename": filename
+        "filename": filename,
+        "content_hash": content_hash,
+        "duplicate": duplicate
     }), 200
 
+@app.route('/sheets/<filename>')
+def list_sheets(filename):
+    """Sheet names of an uploaded workbook, for choosing what /process reads"""
+    filepath = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
+    if not os.path.exists(filepath):
+        return jsonify({"error": "File not found"}), 404
+    if not filepath.endswith('.xlsx'):
+        return jsonify({"error": "Only Excel files have sheets"}), 400
+    try:
+        return jsonify({"filename": filename, "sheets": excel_sheet_names(filepath)}), 200
+    except Exception as e:
+        return jsonify({"error": f"Could not read workbook: {str(e)}"}), 400
+
 @app.route('/process', methods=["POST"])
 def process_file():
     data = request.get_json()
@@ -97,39 +416,321 @@ def process_file():
     filepath = os.path.join(UPLOAD_FOLDER, data["filename"])
     if not os.path.exists(filepath):
         return jsonify({"error": "File not found"}), 404
+    try:
+        wait = min(float(data.get("wait", 0)), MAX_JOB_WAIT)
+    except (TypeError, ValueError):
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    # Workbooks are read a sheet at a time, the first one unless chosen
+    sheet = data.get("sheet")
+    if filepath.endswith('.xlsx'):
+        try:
+            available = excel_sheet_names(filepath)
+        except Exception as e:
+            return jsonify({"error": f"Could not read workbook: {str(e)}"}), 400
+        if "sheets" in data:
+            return process_sheets(filepath, data["sheets"], available, wait)
+        if sheet is None and available:
+            sheet = available[0]  # Cached alike whether or not it was named
+        if sheet is not None and sheet not in available:
+            return jsonify({"error": f"Unknown sheet: {sheet}", "sheets": available}), 400
+    elif sheet is not None or "sheets" in data:
+        return jsonify({"error": "Sheets can only be chosen for Excel files"}), 400
+
+    # Identical content was already parsed and processed, reuse that dataset
+    cache_key = (uploads.content_hash(filepath), PROCESSING_VERSION)
+    if sheet is not None:
+        cache_key += (sheet,)
+    cached = cached_dataset(cache_key)
+    if cached:
+        return jsonify(cached), 200
+
+    # Large CSVs (or any CSV on request) are ingested chunk by chunk
+    stream = data.get("stream")
+    if stream is None:
+        stream = os.path.getsize(filepath) > STREAM_THRESHOLD
+    if stream and filepath.endswith('.csv'):
+        return start_streaming_ingest(filepath, cache_key)
 
+    # Everything else is parsed on the process pool
     try:
-        # Read file based on type
-        if filepath.endswith('.csv'):
-            df = pd.read_csv(filepath)
+        job = submit_dataset(filepath, cache_key, sheet)
+    except QueueFull:
+        return jsonify({"error": "Server is busy, try again later"}), 503
+
+    # Optionally hold the request open until the job is done
+    job = process_jobs.wait(job.id, wait)
+    return job_response(job)
+
+def process_sheets(filepath, sheets, available, wait):
+    """Process several sheets of a workbook ("*" for all), each as its own dataset
+
+    Every sheet is a separate job, so the process pool parses them in
+    parallel. The response lists each sheet's status like /jobs does.
+    """
+    if sheets == "*":
+        sheets = available
+    if not isinstance(sheets, list) or not sheets:
+        return jsonify({"error": "sheets must be a list of sheet names or \"*\""}), 400
+    unknown = [sheet for sheet in sheets if sheet not in available]
+    if unknown:
+        return jsonify({"error": f"Unknown sheets: {', '.join(map(str, unknown))}",
+                        "sheets": available}), 400
+
+    content_hash = uploads.content_hash(filepath)
+    results = {}
+    queue = []
+    for sheet in dict.fromkeys(sheets):
+        cache_key = (content_hash, PROCESSING_VERSION, sheet)
+        cached = cached_dataset(cache_key)
+        if cached:
+            results[sheet] = dict(cached, status="done")
         else:
-            df = pd.read_excel(filepath)
-        
-        if df.empty:
-            return jsonify({"message": "File is empty"}), 200
-            
-        # Process the data
-        df = process_dataframe(df)
-        records = df.to_dict(orient="records")
-        
-        # Store with unique ID
-        file_id = str(uuid.uuid4())
-        data_storage[file_id] = records
-        
-        return jsonify({
-            "message": "File processed successfully",
-            "file_id": file_id,
-            "preview": records[:5]
-        }), 200
-        
+            queue.append((sheet, cache_key))
+    if process_jobs.pending() + len(queue) > process_jobs.max_pending:
+        return jsonify({"error": "Server is busy, try again later"}), 503
+    try:
+        jobs = [(sheet, submit_dataset(filepath, cache_key, sheet)) for sheet, cache_key in queue]
+    except QueueFull:
+        return jsonify({"error": "Server is busy, try again later"}), 503
+
+    deadline = time.time() + wait
+    for sheet, job in jobs:
+        job = process_jobs.wait(job.id, max(0, deadline - time.time()))
+        results[sheet] = job_body(job)
+    sheets = [dict(results[sheet], sheet=sheet) for sheet in dict.fromkeys(sheets)]
+    complete = not any(result["status"] in PENDING for result in sheets)
+    return jsonify({"sheets": sheets, "complete": complete}), 200 if complete else 202
+
+def cached_dataset(cache_key):
+    """The /process result for content processed before, if its dataset still exists"""
+    cached = processed_cache.get(cache_key)
+    if cached is None and data_storage.shared:
+        # Another server process may have processed the same content since
+        remember_processed(data_storage.refresh_catalog())
+        cached = processed_cache.get(cache_key)
+    if cached:
+        # Datasets changed since, by /upload_images, no longer match the content
+        record = data_storage.metadata(cached["file_id"], refresh=True)
+        if not record or list(record.get("cache_key") or ()) != list(cache_key):
+            processed_cache.pop(cache_key, None)
+            cached = None
+    cache_lookups.inc(cache="processed", result="hit" if cached else "miss")
+    if not cached or cached["file_id"] not in data_storage:
+        return None
+    return {
+        "message": "File processed successfully",
+        "file_id": cached["file_id"],
+        "preview": cached["preview"],
+        "cached": True
+    }
+
+def submit_dataset(filepath, cache_key, sheet=None):
+    """Queue parsing a file, or one sheet of a workbook, on the process pool"""
+    return process_jobs.submit(
+        load_dataset, filepath, sheet, key=cache_key,
+        on_done=lambda job, result: store_processed(*result, cache_key, sheet))
+
+def store_processed(df, memory_report, phases, cache_key, sheet=None):
+    """Register a dataset parsed by a worker, returning the /process result"""
+    # The worker timed parsing and processing, the rest happens here
+    for name, seconds in phases.items():
+        phase_seconds.observe(seconds, route="/process", phase=name)
+    if df.empty:
+        return {"message": "File is empty"}
+
+    # Store with unique ID
+    file_id = str(uuid.uuid4())
+    with phase("store", route="/process"):
+        df = data_storage.put(file_id, df)
+    with phase("serialize", route="/process"):
+        preview = records(df, positions=slice(0, 5))
+    finish_dataset(file_id, cache_key, preview, sheet)
+    return {
+        "message": "File processed successfully",
+        "file_id": file_id,
+        "sheet": sheet,
+        "preview": preview,
+        "memory": memory_report
+    }
+
+def job_body(job):
+    """Job status, with the /process result inlined once it is done"""
+    body = job.to_dict()
+    body["status_url"] = f"/jobs/{job.id}"
+    result = body.pop("result")
+    if job.status == "done":
+        body.update(result)
+    elif job.status in ("failed", "timed_out"):
+        body["error"] = f"Processing failed: {job.error}"
+    return body
+
+def job_response(job):
+    return status_response(job_body(job))
+
+def status_response(body):
+    if body["status"] == "done":
+        return jsonify(body), 200
+    if body["status"] in ("failed", "timed_out"):
+        return jsonify(body), 500
+    return jsonify(body), 202
+
+def publish_status(key, body):
+    """Let the other server processes answer for progress this one owns"""
+    if shared_status is not None:
+        shared_status.write(key, body)
+
+def wait_shared_job(job_id, wait):
+    """Status of a job queued by another process, polled for up to wait seconds"""
+    deadline = time.time() + wait
+    while True:
+        body = shared_status.read(f"job-{job_id}")
+        if body is None or body["status"] not in PENDING or time.time() >= deadline:
+            return body
+        time.sleep(SHARED_POLL_INTERVAL)
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    try:
+        wait = min(float(request.args.get('wait', 0)), MAX_JOB_WAIT)
+    except ValueError:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    job = process_jobs.wait(job_id, wait)
+    if job is not None:
+        return job_response(job)
+    body = wait_shared_job(job_id, wait) if shared_status is not None else None
+    if body is None:
+        return jsonify({"error": "Unknown job_id"}), 404
+    return status_response(body)
+
+@app.route('/jobs')
+def job_stats():
+    return jsonify(process_jobs.stats()), 200
+
+def finish_dataset(file_id, cache_key, preview, sheet=None):
+    """Catalog and index a fully ingested dataset, making it reusable for identical content"""
+    data_storage.describe(file_id, cache_key=list(cache_key), preview=preview, sheet=sheet)
+    # Build the search index now, rather than on the first query
+    with phase("index", route="/process"):
+        data_storage.derived(file_id, "search_index", SearchIndex)
+    processed_cache[cache_key] = {"file_id": file_id, "preview": preview}
+    sweep_datasets(keep=file_id)
+
+def sweep_datasets(keep=None):
+    """Make room for a new dataset, forgetting whatever pointed at the ones deleted"""
+    deleted = set(data_storage.sweep(keep=keep))
+    for key, cached in list(processed_cache.items()):
+        if cached["file_id"] in deleted:
+            processed_cache.pop(key, None)
+    cutoff = time.time() - INGEST_RETENTION
+    for file_id, status in list(ingest_status.items()):
+        if status["finished"] and status["finished"] < cutoff:
+            ingest_status.pop(file_id, None)
+    if shared_status is not None:
+        shared_status.prune()
+
+def start_streaming_ingest(filepath, cache_key):
+    """Store the first chunk of a CSV and ingest the rest in the background"""
+    chunks = iter_csv_chunks(filepath, CSV_CHUNK_ROWS)
+    try:
+        with phase("parse"):
+            first = next(chunks, None)
     except Exception as e:
         return jsonify({"error": f"Processing failed: {str(e)}"}), 500
+    if first is None or first[1].empty:
+        return jsonify({"message": "File is empty"}), 200
+
+    # The first chunk is queryable as soon as this returns
+    file_id = str(uuid.uuid4())
+    df = data_storage.put(file_id, first[1])
+    preview = records(df, positions=slice(0, 5))
+    ingest_status[file_id] = {
+        "rows": len(df),
+        "done": False,
+        "error": None,
+        "started": time.time(),
+        "finished": None
+    }
+    publish_status(f"ingest-{file_id}", ingest_status[file_id])
+    threading.Thread(target=ingest_remaining, args=(file_id, chunks, cache_key, preview),
+                     daemon=True).start()
+
+    return jsonify({
+        "message": "File processing started",
+        "file_id": file_id,
+        "preview": preview,
+        "rows": len(df),
+        "complete": False
+    }), 200
+
+def ingest_remaining(file_id, chunks, cache_key, preview):
+    """Append the remaining chunks of a streamed CSV to its dataset"""
+    status = ingest_status[file_id]
+    try:
+        for _, chunk in chunks:
+            data_storage.append(file_id, chunk)
+            status["rows"] += len(chunk)
+            publish_status(f"ingest-{file_id}", status)
+        # Chunks are compacted together, so categories cover the whole file
+        with phase("transform", route="/process"):
+            df, status["memory"] = compact_dtypes(data_storage.get(file_id).copy())
+        data_storage.put(file_id, df)
+        finish_dataset(file_id, cache_key, preview)
+    except Exception as e:
+        status["error"] = f"Processing failed: {str(e)}"
+    status["finished"] = time.time()
+    status["done"] = True
+    publish_status(f"ingest-{file_id}", status)
+
+def ingest_progress(file_id):
+    """Status of a chunked ingest run by this or another server process"""
+    status = ingest_status.get(file_id)
+    if status is None and shared_status is not None:
+        status = shared_status.read(f"ingest-{file_id}")
+    return status
+
+@app.route('/process_status/<file_id>')
+def process_status(file_id):
+    status = ingest_progress(file_id)
+    if status is not None:
+        return jsonify(dict(status, file_id=file_id)), 200
+    # Processed in one go (or before a restart), so it is already complete
+    record = data_storage.metadata(file_id)
+    if record is not None:
+        return jsonify({"file_id": file_id, "rows": record["rows"],
+                        "done": True, "error": None}), 200
+    if file_id in data_storage:
+        return jsonify({"file_id": file_id, "rows": len(data_storage.get(file_id)),
+                        "done": True, "error": None}), 200
+    return jsonify({"error": "Unknown file_id"}), 404
 
 @app.route('/get_data/<file_id>')
 def get_data(file_id):
-    if file_id not in data_storage:
+    df = data_storage.get(file_id)
+    if df is None:
         return jsonify({"data": []}), 200  # Return empty list instead of error
-    return jsonify({"data": data_storage[file_id]}), 200
+
+    try:
+        offset, limit = parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination: {str(e)}"}), 400
+    columns = parse_columns_arg(request.args)
+    try:
+        sort_col, descending = parse_sort_args(request.args, df)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if missing_columns(df, columns):
+        return jsonify({"error": f"Unknown columns: {', '.join(missing_columns(df, columns))}"}), 400
+
+    # After the first request, sorted paging only slices the cached order
+    if sort_col:
+        positions = sorted_rows(file_id, sort_col, descending)
+    else:
+        positions = np.arange(len(df))
+
+    return page_response(df, positions, "data", offset, limit, columns,
+                         ndjson=request.args.get('format') == 'ndjson')
 
 @app.route('/search', methods=['POST'])
 def search_data():
@@ -137,19 +738,135 @@ def search_data():
     if not data or 'file_id' not in data or 'query' not in data:
         return jsonify({"error": "Missing file_id or query"}), 400
 
+    try:
+        offset, limit = parse_page_args(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid pagination parameters: {str(e)}"}), 400
+
     # Check if data exists
     file_id = data['file_id']
-    if file_id not in data_storage:
+    df = data_storage.get(file_id)
+    if df is None:
         return jsonify({"results": []}), 200  # Return empty results instead of error
+    try:
+        sort_col, descending = parse_sort_args(data, df)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Search through records
+    # Typing refines a query, so reuse the matches of the longest cached
+    # query it contains; otherwise look up trigram candidates and verify them
     query = data['query'].lower()
-    results = [
-        record for record in data_storage[file_id]
-        if any(query in str(value).lower() for value in record.values())
-    ]
+    with phase("index"):
+        index = data_storage.derived(file_id, "search_index", SearchIndex)
+    cache = data_storage.derived(file_id, "searches", lambda df: LRUCache(SEARCH_CACHE_SIZE))
+    positions = cache.get(query)
+    cache_lookups.inc(cache="search", result="miss" if positions is None else "hit")
+    if positions is None:
+        with phase("search"):
+            positions = index.search(query, within=narrowest_cached(cache, query))
+        cache.put(query, positions)
+
+    # Sorted matches are cached too, so paging through them is a slice
+    if sort_col:
+        sorted_cache = data_storage.derived(file_id, "sorted_searches",
+                                            lambda df: LRUCache(SEARCH_CACHE_SIZE))
+        key = (query, sort_col, descending)
+        ordered = sorted_cache.get(key)
+        cache_lookups.inc(cache="sorted_search", result="miss" if ordered is None else "hit")
+        if ordered is None:
+            ordered = sorted_subset(file_id, len(df), positions, sort_col, descending)
+            sorted_cache.put(key, ordered)
+        positions = ordered
+
+    return page_response(df, positions, "results", offset, limit)
+
+@app.route('/query', methods=['POST'])
+def query_data():
+    data = request.get_json()
+    if not data or 'file_id' not in data or 'filter' not in data:
+        return jsonify({"error": "Missing file_id or filter"}), 400
+
+    df = data_storage.get(data['file_id'])
+    if df is None:
+        return jsonify({"results": []}), 200  # Same as search for unknown datasets
+
+    try:
+        offset, limit = parse_page_args(data)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination: {str(e)}"}), 400
+    columns = data.get('columns')
+    if columns is not None:
+        columns = [str(col).lower() for col in columns]
+        if missing_columns(df, columns):
+            return jsonify({"error": f"Unknown columns: {', '.join(missing_columns(df, columns))}"}), 400
+    try:
+        sort_col, descending = parse_sort_args(data, df)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Evaluate the filter as vectorized masks over the stored frame
+    try:
+        with phase("transform"):
+            positions = np.flatnonzero(build_mask(df, data['filter']))
+    except QueryError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+    if sort_col:
+        positions = sorted_subset(data['file_id'], len(df), positions, sort_col, descending)
+
+    return page_response(df, positions, "results", offset, limit, columns)
+
+@app.route('/aggregate', methods=['POST'])
+def aggregate_data():
+    data = request.get_json()
+    if not data or 'file_id' not in data:
+        return jsonify({"error": "Missing file_id"}), 400
+
+    file_id = data['file_id']
+    spec = {key: value for key, value in data.items() if key != 'file_id'}
+    df = data_storage.get(file_id)
+    if df is None:
+        return jsonify({"error": "Unknown file_id"}), 404
+
+    # Results are memoized per dataset and spec, and dropped with the dataset
+    cache = data_storage.derived(file_id, "aggregates", lambda df: LRUCache(AGGREGATE_CACHE_SIZE))
+    key = spec_key(spec)
+    result = cache.get(key)
+    cached = result is not None
+    cache_lookups.inc(cache="aggregate", result="hit" if cached else "miss")
+    if not cached:
+        try:
+            with phase("transform"):
+                result = aggregate(df, spec)
+        except AggregateError as e:
+            return jsonify({"error": f"Invalid aggregate: {str(e)}"}), 400
+        cache.put(key, result)
+
+    return jsonify(dict(result, file_id=file_id, cached=cached)), 200
+
+@app.route('/storage_stats')
+def storage_stats():
+    return jsonify(data_storage.stats()), 200
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape target; each server process reports its own requests"""
+    stats = data_storage.stats()
+    for event in data_storage.counters:
+        store_events.set(stats[event], event=event)
+    for state in ("resident", "spilled", "catalogued"):
+        store_datasets.set(stats[f"{state}_datasets"], state=state)
+    store_bytes.set(stats["resident_bytes"])
+    store_budget.set(stats["memory_budget"])
+    pending_jobs.set(process_jobs.pending())
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
 
-    return jsonify({"results": results}), 200
+@app.route('/datasets')
+def list_datasets():
+    """Processed datasets the server can serve, newest first, without loading them"""
+    datasets = [{key: value for key, value in record.items() if key != "preview"}
+                for record in data_storage.catalog()]
+    datasets.sort(key=lambda record: record.get("updated", 0), reverse=True)
+    return jsonify({"datasets": datasets}), 200
 
 @app.route('/upload_image', methods=["POST"])
 def upload_image():
@@ -160,6 +877,8 @@ def upload_image():
         return jsonify({"error": "No image uploaded"}), 400
 
     file_id = request.form["file_id"]
+    if not is_valid_file_id(file_id):
+        return jsonify({"error": "Invalid file ID"}), 400
     image = request.files["image"]
     
     if not image.filename:
@@ -167,42 +886,206 @@ def upload_image():
     if not is_valid_file(image.filename, ALLOWED_IMAGES):
         return jsonify({"error": "Invalid image format"}), 400
 
-    # Save image with unique name
-    filename = f"{file_id}__{secure_filename(image.filename)}"
-    image.save(os.path.join(IMAGE_FOLDER, filename))
+    # Save image under a name unique to its content
+    folder = os.path.join(os.getcwd(), IMAGE_FOLDER)
+    filename, sha = write_image(image.stream, folder, file_id, secure_filename(image.filename))
+    image_hashes.remember(os.path.join(folder, filename), sha)
     
     return jsonify({
         "message": "Image uploaded successfully",
         "image_url": f"http://127.0.0.1:5000/get_image/{filename}"
     }), 200
 
+@app.route('/upload_images', methods=["POST"])
+def upload_images():
+    """Store many images at once and optionally bind them to dataset rows
+
+    Images come as repeated multipart "images" parts or as one zip "archive".
+    A "manifest" form field (or manifest.json inside the zip) maps each image
+    filename to the row positions whose image_url should point at it.
+    """
+    if "file_id" not in request.form:
+        return jsonify({"error": "No file ID provided"}), 400
+    file_id = request.form["file_id"]
+    if not is_valid_file_id(file_id):
+        return jsonify({"error": "Invalid file ID"}), 400
+
+    try:
+        manifest = None
+        if "archive" in request.files:
+            batch, manifest = zip_files(request.files["archive"].stream)
+        else:
+            batch = multipart_files(request.files.getlist("images"))
+        if request.form.get("manifest"):
+            manifest = parse_manifest(request.form["manifest"])
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    if not batch:
+        return jsonify({"error": "No images uploaded"}), 400
+    if len(batch) > MAX_BATCH_IMAGES:
+        return jsonify({"error": f"At most {MAX_BATCH_IMAGES} images per batch"}), 400
+
+    # Binding needs a complete dataset, so rows can be checked up front
+    row_count = None
+    if manifest:
+        status = ingest_progress(file_id)
+        if status is not None and not status["done"]:
+            return jsonify({"error": "Dataset is still being processed"}), 409
+        df = data_storage.get(file_id)
+        if df is None:
+            return jsonify({"error": "Dataset not found"}), 404
+        row_count = len(df)
+
+    # Validate every file before writing any of them
+    to_write = []
+    seen = set()
+    for item in batch:
+        filename = f"{file_id}__{secure_filename(item.name)}"
+        rows = manifest_rows(manifest, item)
+        if not is_valid_file(item.name, ALLOWED_IMAGES):
+            error = "Invalid image format"
+        elif item.size is not None and item.size > MAX_IMAGE_SIZE:
+            error = "Image is too large"
+        elif filename in seen:
+            error = "Duplicate filename in batch"
+        elif any(not 0 <= row < row_count for row in rows):
+            error = f"Rows must be between 0 and {row_count - 1}"
+        else:
+            error = None
+        if error:
+            item.status.update(status="rejected", error=error)
+            continue
+        seen.add(filename)
+        item.status["rows"] = rows
+        to_write.append(item)
+
+    def save(item):
+        folder = os.path.join(os.getcwd(), IMAGE_FOLDER)
+        with item.open() as source:
+            filename, sha = write_image(source, folder, file_id, secure_filename(item.name))
+        image_hashes.remember(os.path.join(folder, filename), sha)
+        return filename
+
+    futures = [(item, image_writer.submit(save, item)) for item in to_write]
+    positions, urls = [], []
+    for item, future in futures:
+        try:
+            filename = future.result()
+        except Exception as e:
+            item.status.update(status="failed", error=f"Could not save image: {str(e)}")
+            continue
+        item.status.update(status="saved", image_url=f"http://127.0.0.1:5000/get_image/{filename}")
+        positions.extend(item.status["rows"])
+        urls.extend([item.status["image_url"]] * len(item.status["rows"]))
+
+    # Point the bound rows at their new images in one update. The dataset
+    # stops being the /process result for its content first, so no process
+    # hands it out for a fresh upload of the same file
+    if positions:
+        for key, cached in list(processed_cache.items()):
+            if cached["file_id"] == file_id:
+                processed_cache.pop(key, None)
+        data_storage.describe(file_id, cache_key=None)
+        data_storage.update(file_id, "image_url", positions, urls)
+        preview = records(data_storage.get(file_id), positions=slice(0, 5))
+        data_storage.describe(file_id, preview=preview)
+
+    results = [item.status for item in batch]
+    saved = sum(1 for result in results if result["status"] == "saved")
+    return jsonify({
+        "message": f"Uploaded {saved} of {len(results)} images",
+        "saved": saved,
+        "rows_updated": len(positions),
+        "results": results
+    }), 200
+
+def load_placeholder(name, mimetype):
+    """Read a placeholder image into memory, with its validators"""
+    path = os.path.join(os.getcwd(), IMAGE_FOLDER, name)
+    if not os.path.isfile(path):
+        return None
+    with open(path, "rb") as f:
+        data = f.read()
+    return {
+        "path": path,
+        "data": data,
+        "mimetype": mimetype,
+        "etag": hashlib.sha256(data).hexdigest(),
+        "last_modified": os.path.getmtime(path)
+    }
+
+# Placeholders for missing images are resolved once, at startup
+PLACEHOLDERS = {
+    "gif": load_placeholder("cat.gif", "image/gif"),
+    "default": load_placeholder("placeholder.png", "image/png")
+}
+
+def image_response(body, mimetype, etag, last_modified, immutable=False):
+    """Serve image bytes or a file with validators, answering 304 when they match"""
+    if isinstance(body, bytes):
+        response = Response(body, mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response = response.make_conditional(request)
+    else:
+        response = send_file(body, mimetype=mimetype, etag=etag,
+                             last_modified=last_modified, conditional=True)
+
+    if immutable:
+        response.headers["Cache-Control"] = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        # May change in place, so clients revalidate (cheaply, via 304)
+        response.headers["Cache-Control"] = "no-cache"
+    return response
+
 @app.route('/get_image/<filename>')
 def get_image(filename):
+    try:
+        size = parse_size(request.args)
+        frames = parse_frames(request.args)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid image size: {str(e)}"}), 400
+
+    # One stat call covers existence and the validators
     image_path = os.path.join(os.getcwd(), IMAGE_FOLDER, filename)
-    
-    # Handle missing images
-    if not os.path.exists(image_path):
-        # Use appropriate placeholder based on file type
-        if filename.lower().endswith('.gif'):
-            placeholder = os.path.join(os.getcwd(), IMAGE_FOLDER, "cat.gif")
-            if os.path.exists(placeholder):
-                return send_file(placeholder, mimetype="image/gif")
-        
-        # Default placeholder
-        placeholder = os.path.join(os.getcwd(), IMAGE_FOLDER, "placeholder.png")
-        if os.path.exists(placeholder):
-            return send_file(placeholder, mimetype="image/png")
-        return jsonify({"error": "Image not found"}), 404
-
-    # Determine correct mimetype
-    if filename.lower().endswith(".png"):
-        mimetype = "image/png"
-    elif filename.lower().endswith(".gif"):
-        mimetype = "image/gif"
+    try:
+        image_stat = os.stat(image_path)
+        found = stat.S_ISREG(image_stat.st_mode)
+    except OSError:
+        found = False
+
+    if found:
+        mimetype = IMAGE_MIMETYPES.get(os.path.splitext(filename)[1].lower(), "image/jpeg")
+        etag = image_hashes.get(image_path, image_stat)
+        last_modified = image_stat.st_mtime
+        # Only a name carrying this content's hash can be cached forever
+        immutable = names_content(filename, etag)
     else:
-        mimetype = "image/jpeg"
+        # Use appropriate placeholder based on file type
+        placeholder = PLACEHOLDERS["gif"] if filename.lower().endswith('.gif') else None
+        placeholder = placeholder or PLACEHOLDERS["default"]
+        if placeholder is None:
+            return jsonify({"error": "Image not found"}), 404
+        image_path = placeholder["path"]
+        mimetype = placeholder["mimetype"]
+        etag = placeholder["etag"]
+        last_modified = placeholder["last_modified"]
+        immutable = False  # The real image may be uploaded later
+
+    # Serve a cached thumbnail when a size is given; images Pillow can't
+    # resize (corrupt, truncated, decompression bombs) are sent as they are
+    if size is not None:
+        try:
+            data, thumb_mimetype = thumbnails.get(image_path, size, frames)
+        except THUMBNAIL_ERRORS:
+            pass
+        else:
+            etag = f"{etag}-{size[0]}x{size[1]}-{frames or 'all'}"
+            return image_response(data, thumb_mimetype, etag, last_modified, immutable)
 
-    return send_file(image_path, mimetype=mimetype)
+    if not found:
+        return image_response(placeholder["data"], mimetype, etag, last_modified)
+    return image_response(image_path, mimetype, etag, last_modified, immutable)
 
 if __name__ == "__main__":
     app.run(debug=True)
\ No newline at end of file
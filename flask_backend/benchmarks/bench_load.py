@@ -0,0 +1,109 @@
+"""Load test the gunicorn entry point at several worker counts
+
+Starts `gunicorn -c gunicorn.conf.py wsgi:app` in a scratch directory for
+each worker count, processes one synthetic dataset, then hits /get_data
+pages and /search from client processes and reports throughput and latency.
+Usage: python benchmarks/bench_load.py [workers ...]   (needs gunicorn)
+"""
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import requests
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+from bench_memory import make_frame  # noqa: E402
+
+ROWS = 100_000
+CLIENTS = 8
+SECONDS = 10
+PAGE_SIZE = 200
+PORT = 5099
+QUERIES = ["product 42", "dairy", "item_7", "99"]
+
+
+def start_server(workers, cwd):
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{PORT}",
+               PYTHONPATH=BACKEND_DIR)
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py"),
+         "wsgi:app"],
+        cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{PORT}/", timeout=5)
+            return server
+        except requests.RequestException:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("gunicorn did not start")
+
+
+def load_dataset(cwd):
+    """Upload and process the synthetic sheet, returning its file_id"""
+    path = os.path.join(cwd, "bench.csv")
+    make_frame(ROWS).to_csv(path, index=False)
+    base = f"http://127.0.0.1:{PORT}"
+    with open(path, "rb") as f:
+        requests.post(f"{base}/upload", files={"file": f}).raise_for_status()
+    result = requests.post(f"{base}/process",
+                           json={"filename": "bench.csv", "stream": False, "wait": 30}).json()
+    return result["file_id"]
+
+
+def client(file_id, seconds, seed):
+    """Request pages and searches until time runs out, returning latencies"""
+    rng = random.Random(seed)
+    session = requests.Session()
+    base = f"http://127.0.0.1:{PORT}"
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        if rng.random() < 0.8:
+            offset = rng.randrange(0, ROWS - PAGE_SIZE)
+            response = session.get(f"{base}/get_data/{file_id}",
+                                   params={"offset": offset, "limit": PAGE_SIZE})
+        else:
+            response = session.post(f"{base}/search", json={
+                "file_id": file_id, "query": rng.choice(QUERIES), "limit": PAGE_SIZE})
+        response.raise_for_status()
+        if b'"total"' not in response.content:
+            raise RuntimeError("A worker couldn't find the dataset")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def main(worker_counts):
+    print(f"{ROWS} rows, {CLIENTS} clients, {SECONDS}s per run")
+    print(f"{'workers':>8} {'requests':>9} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for workers in worker_counts:
+        with tempfile.TemporaryDirectory() as cwd:
+            server = start_server(workers, cwd)
+            try:
+                file_id = load_dataset(cwd)
+                # Every worker loads the dataset once before timing starts
+                with ProcessPoolExecutor(CLIENTS) as pool:
+                    list(pool.map(client, [file_id] * CLIENTS, [1] * CLIENTS, range(CLIENTS)))
+                    runs = pool.map(client, [file_id] * CLIENTS, [SECONDS] * CLIENTS,
+                                    range(CLIENTS, 2 * CLIENTS))
+                    latencies = [latency for run in runs for latency in run]
+            finally:
+                server.terminate()
+                server.wait()
+        print(f"{workers:>8} {len(latencies):>9} {len(latencies) / SECONDS:>8.0f} "
+              f"{percentile(latencies, 50) * 1000:>8.1f} {percentile(latencies, 95) * 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 2, 4])
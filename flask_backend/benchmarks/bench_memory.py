@@ -0,0 +1,54 @@
+"""Compare per-dataset memory of the records layout against the columnar store
+
+Usage: python benchmarks/bench_memory.py [rows ...]   (run from flask_backend/)
+"""
+import os
+import sys
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import process_dataframe, compact_dtypes  # noqa: E402
+from dataset_store import DatasetStore  # noqa: E402
+
+
+def make_frame(rows, seed=0):
+    """Synthetic product sheet with text, numeric and image columns"""
+    rng = np.random.default_rng(seed)
+    categories = np.array(["fruit", "dairy", "bakery", "frozen", "drinks"])
+    return pd.DataFrame({
+        "ID": np.arange(rows),
+        "Name": [f"product {i}" for i in range(rows)],
+        "Category": categories[rng.integers(0, len(categories), rows)],
+        "Price": rng.uniform(0.5, 100, rows).round(2),
+        "Stock": rng.integers(0, 1000, rows),
+        "Image": [f"item_{i % 50}.png" for i in range(rows)],
+    })
+
+
+def records_bytes(df):
+    """Bytes allocated to hold df as a list of row dicts"""
+    tracemalloc.start()
+    records = df.to_dict(orient="records")
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return size
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'records MB':>12} {'columnar MB':>12} {'ratio':>7}")
+    for rows in sizes:
+        df, _ = compact_dtypes(process_dataframe(make_frame(rows)))
+        store = DatasetStore()
+        df = store.put("bench", df)
+        columnar = store.memory_usage("bench")
+        records = records_bytes(df)
+        print(f"{rows:>10} {records / 2**20:>12.1f} {columnar / 2**20:>12.1f} "
+              f"{records / columnar:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000])
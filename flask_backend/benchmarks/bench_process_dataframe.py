@@ -0,0 +1,52 @@
+"""Microbenchmark process_dataframe against the original per-row version
+
+Usage: python benchmarks/bench_process_dataframe.py [rows ...]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import (process_dataframe, compact_dtypes, find_image_column,  # noqa: E402
+                    format_image_url)
+from bench_memory import make_frame  # noqa: E402
+
+
+def original_process_dataframe(df):
+    """process_dataframe before vectorization"""
+    df.columns = df.columns.str.lower()
+    image_col = find_image_column(df)
+    if image_col:
+        df.rename(columns={image_col: 'image_url'}, inplace=True)
+        df['image_url'] = df['image_url'].apply(format_image_url)
+    else:
+        df['image_url'] = [f"http://127.0.0.1:5000/get_image/sample{(i % 5) + 1}.jpg"
+                           for i in range(len(df))]
+    return df
+
+
+def timed(fn, df):
+    start = time.perf_counter()
+    result = fn(df)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(sizes):
+    print(f"{'rows':>9} {'case':>9} {'original ms':>12} {'vectorized ms':>14} "
+          f"{'compact ms':>11} {'MB before':>10} {'MB after':>9}")
+    for rows in sizes:
+        frame = make_frame(rows)
+        cases = {"image col": frame, "no image": frame.drop(columns=["Image"])}
+        for case, source in cases.items():
+            expected, original_ms = timed(original_process_dataframe, source.copy())
+            result, vector_ms = timed(process_dataframe, source.copy())
+            (result, report), compact_ms = timed(compact_dtypes, result)
+            pd.testing.assert_frame_equal(result.astype(object), expected.astype(object))
+            print(f"{rows:>9} {case:>9} {original_ms:>12.1f} {vector_ms:>14.1f} {compact_ms:>11.1f} "
+                  f"{report['bytes_before'] / 2**20:>10.1f} {report['bytes_after'] / 2**20:>9.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000])
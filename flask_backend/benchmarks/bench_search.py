@@ -0,0 +1,45 @@
+"""Time /search strategies and check they agree
+
+Compares the original per-record scan, a column-wise scan of the frame and
+the trigram SearchIndex. Usage: python benchmarks/bench_search.py [rows]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import process_dataframe  # noqa: E402
+from search_index import SearchIndex, search_positions  # noqa: E402
+from bench_memory import make_frame  # noqa: E402
+
+QUERIES = ["product 4242", "dairy", "item_7.png", "99", "no such text", "a"]
+
+
+def records_scan(records, query):
+    """The original search_data loop"""
+    return [i for i, record in enumerate(records)
+            if any(query in str(value).lower() for value in record.values())]
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(rows):
+    df = process_dataframe(make_frame(rows))
+    records = df.to_dict(orient="records")
+    index, build_ms = timed(SearchIndex, df)
+    print(f"{rows} rows, index built in {build_ms:.0f} ms ({index.nbytes / 2**20:.1f} MB)")
+    print(f"{'query':>14} {'hits':>7} {'records ms':>11} {'frame ms':>9} {'index ms':>9}")
+    for query in QUERIES:
+        expected, records_ms = timed(records_scan, records, query)
+        scanned, frame_ms = timed(search_positions, df, query)
+        found, index_ms = timed(index.search, query)
+        assert list(scanned) == expected and list(found) == expected, query
+        print(f"{query:>14} {len(expected):>7} {records_ms:>11.1f} {frame_ms:>9.1f} {index_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
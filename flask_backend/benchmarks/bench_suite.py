@@ -0,0 +1,325 @@
+"""End to end benchmark of the backend hot paths, with a regression check
+
+Generates synthetic CSV/XLSX sheets (image column, unicode text, and a wide
+variant), then drives /upload, /process, /get_data, /search and /get_image
+through the Flask test client. Each dataset runs in a fresh process in a
+scratch directory, so its peak RSS (parse workers included) is its own.
+Results can be saved as a JSON baseline, with the machine and package
+versions they were measured with, and later runs compared against it;
+benchmarks/baseline.json is the committed one.
+Usage: python benchmarks/bench_suite.py [--rows N ...] [--formats csv xlsx]
+       [--shapes narrow wide] [--save FILE] [--compare FILE] [--threshold 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from importlib import metadata
+from multiprocessing import get_context
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(tempfile.gettempdir(), "bench_suite_data")  # Generated sheets, reused
+sys.path.insert(0, BACKEND_DIR)
+from bench_memory import make_frame  # noqa: E402
+
+ROWS = [10_000, 100_000, 1_000_000]
+XLSX_MAX_ROWS = 100_000  # Writing a 1M row workbook takes longer than the whole suite
+WIDE_COLUMNS = 50
+IMAGE_COUNT = 50  # make_frame names its images item_0.png .. item_49.png
+PAGE_SIZE = 200
+PAGE_REQUESTS = 50
+QUERIES = ["product 4242", "dairy", "crème", "東京", "item_7", "no such text"]
+IMAGE_REQUESTS = 50
+PROCESS_TIMEOUT = 600
+PACKAGES = ["flask", "numpy", "pandas", "pyarrow", "openpyxl", "pillow"]
+
+# A run regresses when a metric is worse than the baseline by more than
+# the threshold fraction and, for latencies, by more than the noise floor
+DEFAULT_THRESHOLD = 0.25
+NOISE_FLOOR_MS = 1.0
+
+DESCRIPTIONS = ["Crème brûlée № {}", "東京の商品 {}", "Ünïcödé ßtraße {}", "Ελληνικά {} 🍎",
+                "plain text {}"]
+
+
+def make_dataset(rows, shape, seed=0):
+    """make_frame plus unicode descriptions; wide adds WIDE_COLUMNS numeric/text columns"""
+    df = make_frame(rows, seed)
+    df["Description"] = [DESCRIPTIONS[i % len(DESCRIPTIONS)].format(i) for i in range(rows)]
+    if shape == "wide":
+        rng = np.random.default_rng(seed + 1)
+        for j in range(WIDE_COLUMNS):
+            if j % 5 == 0:
+                df[f"Label_{j}"] = [f"label {j}-{i % 97}" for i in range(rows)]
+            else:
+                df[f"Metric_{j}"] = rng.normal(size=rows).round(3)
+    return df
+
+
+def write_dataset(path, rows, fmt, shape):
+    df = make_dataset(rows, shape)
+    tmp = f"{path}.tmp.{fmt}"
+    if fmt == "csv":
+        df.to_csv(tmp, index=False)
+    else:
+        df.to_excel(tmp, index=False, engine="openpyxl")
+    os.replace(tmp, path)
+
+
+def dataset_path(rows, fmt, shape):
+    """Generate the sheet once, keeping it for later runs"""
+    path = os.path.join(DATA_DIR, f"{shape}_{rows}.{fmt}")
+    if not os.path.exists(path):
+        os.makedirs(DATA_DIR, exist_ok=True)
+        # In a spawned process: a benchmark child forked from a large parent
+        # inherits its memory high-water mark, which would inflate peak_rss_mb
+        with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+            pool.submit(write_dataset, path, rows, fmt, shape).result()
+    return path
+
+
+def write_images(folder):
+    from PIL import Image
+    os.makedirs(folder, exist_ok=True)
+    for i in range(IMAGE_COUNT):
+        Image.new("RGB", (512, 512), ((i * 37) % 256, (i * 91) % 256, 128)).save(
+            os.path.join(folder, f"item_{i}.png"))
+
+
+def summarize(latencies, sizes=()):
+    """Latency percentiles in ms, throughput and mean response size"""
+    ordered = sorted(latencies)
+    total = sum(ordered)
+    summary = {
+        "count": len(ordered),
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "mean_ms": total / len(ordered) * 1000,
+        "ops_per_s": len(ordered) / total if total else None
+    }
+    if sizes:
+        summary["mean_bytes"] = sum(sizes) / len(sizes)
+    return summary
+
+
+def timed_requests(send, count):
+    latencies, sizes = [], []
+    for i in range(count):
+        start = time.perf_counter()
+        response = send(i)
+        body = response.data  # Streamed bodies are generated here
+        latencies.append(time.perf_counter() - start)
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}: {body[:200]!r}")
+        sizes.append(len(body))
+    return summarize(latencies, sizes)
+
+
+def wait_processed(client, response):
+    """Follow a /process response until the dataset is complete, returning its file_id"""
+    body = response.get_json()
+    deadline = time.time() + PROCESS_TIMEOUT
+    while response.status_code == 202:
+        if time.time() > deadline:
+            raise RuntimeError("Processing timed out")
+        response = client.get(f"{body['status_url']}?wait=30")
+        body = response.get_json()
+    if response.status_code != 200 or "file_id" not in body:
+        raise RuntimeError(f"Processing failed: {body}")
+    # Large CSVs are ingested in chunks after the first one is returned
+    while body.get("complete") is False or body.get("done") is False:
+        if body.get("error"):
+            raise RuntimeError(body["error"])
+        time.sleep(0.05)
+        body = dict(client.get(f"/process_status/{body['file_id']}").get_json(),
+                    file_id=body["file_id"])
+    return body["file_id"]
+
+
+def run_dataset(path, workdir):
+    """Benchmark one sheet against a fresh app working in workdir"""
+    os.chdir(workdir)
+    write_images("images")
+    import app as backend
+    client = backend.app.test_client()
+    filename = os.path.basename(path)
+    rng = random.Random(0)
+    results = {}
+
+    start = time.perf_counter()
+    with open(path, "rb") as f:
+        response = client.post("/upload", data={"file": (f, filename)},
+                               content_type="multipart/form-data")
+    if response.status_code != 200:
+        raise RuntimeError(f"Upload failed: {response.get_json()}")
+    results["upload"] = summarize([time.perf_counter() - start])
+
+    start = time.perf_counter()
+    file_id = wait_processed(client, client.post("/process", json={"filename": filename,
+                                                                   "wait": 30}))
+    results["process"] = summarize([time.perf_counter() - start])
+    rows = client.get(f"/process_status/{file_id}").get_json()["rows"]
+
+    def page(**params):
+        offset = rng.randrange(0, max(1, rows - PAGE_SIZE))
+        return dict(params, offset=offset, limit=PAGE_SIZE)
+
+    results["get_data_json"] = timed_requests(
+        lambda i: client.get(f"/get_data/{file_id}", query_string=page()), PAGE_REQUESTS)
+    results["get_data_arrow"] = timed_requests(
+        lambda i: client.get(f"/get_data/{file_id}", query_string=page(),
+                             headers={"Accept": "application/vnd.apache.arrow.stream"}),
+        PAGE_REQUESTS)
+    results["get_data_sorted"] = timed_requests(
+        lambda i: client.get(f"/get_data/{file_id}", query_string=page(sort="price")),
+        PAGE_REQUESTS)
+    # The first pass finds the matches, the second hits the per-dataset cache
+    for name in ("search_cold", "search_warm"):
+        results[name] = timed_requests(
+            lambda i: client.post("/search", json={"file_id": file_id, "query": QUERIES[i],
+                                                   "limit": PAGE_SIZE}),
+            len(QUERIES))
+    results["get_image"] = timed_requests(
+        lambda i: client.get(f"/get_image/item_{i % IMAGE_COUNT}.png"), IMAGE_REQUESTS)
+    results["get_image_thumbnail"] = timed_requests(
+        lambda i: client.get(f"/get_image/item_{i % IMAGE_COUNT}.png?w=64&h=64"), IMAGE_REQUESTS)
+    return {"rows": rows, "operations": results}
+
+
+def run_isolated(path):
+    """run_dataset in a child process, adding the peak RSS of it and its parse workers"""
+    with tempfile.TemporaryDirectory(prefix="bench_suite_") as workdir:
+        child = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--run", path,
+                                  "--workdir", workdir], stdout=subprocess.PIPE)
+        output = child.stdout.read()
+        # wait4's usage covers the child and the descendants it reaped, i.e. the job pool
+        _, status, usage = os.wait4(child.pid, 0)
+    if os.WIFSIGNALED(status):
+        # Typically SIGKILL from the kernel running out of memory
+        raise RuntimeError(f"Benchmark of {path} was killed by signal {os.WTERMSIG(status)}")
+    if status != 0:
+        raise RuntimeError(f"Benchmark of {path} failed")
+    result = json.loads(output)
+    result["peak_rss_mb"] = usage.ru_maxrss / 1024  # Linux reports KiB
+    return result
+
+
+def machine():
+    """What besides the code the numbers depend on"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "memory_gb": round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3, 1),
+        "packages": {name: metadata.version(name) for name in PACKAGES},
+        "commit": commit
+    }
+
+
+def compare(results, baseline, threshold):
+    """Metrics worse than the baseline by more than threshold, as messages"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("datasets", {}).get(name)
+        if base is None or "error" in base:
+            continue
+        if "error" in result:
+            regressions.append(f"{name} failed: {result['error']}")
+            continue
+        if result["peak_rss_mb"] > base["peak_rss_mb"] * (1 + threshold):
+            regressions.append(f"{name} peak RSS {base['peak_rss_mb']:.0f} -> "
+                               f"{result['peak_rss_mb']:.0f} MB")
+        for op, stats in result["operations"].items():
+            base_stats = base["operations"].get(op)
+            if base_stats is None:
+                continue
+            for metric in ("p50_ms", "p95_ms"):
+                before, after = base_stats[metric], stats[metric]
+                if after > before * (1 + threshold) and after - before > NOISE_FLOOR_MS:
+                    regressions.append(f"{name} {op} {metric} {before:.1f} -> {after:.1f}")
+    return regressions
+
+
+def print_results(name, result):
+    print(f"\n{name}: {result['rows']} rows, peak RSS {result['peak_rss_mb']:.0f} MB")
+    print(f"{'operation':>20} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'ops/s':>8} {'bytes':>10}")
+    for op, stats in result["operations"].items():
+        ops = f"{stats['ops_per_s']:.0f}" if stats["ops_per_s"] else "-"
+        size = f"{stats['mean_bytes']:.0f}" if "mean_bytes" in stats else "-"
+        print(f"{op:>20} {stats['count']:>6} {stats['p50_ms']:>9.1f} {stats['p95_ms']:>9.1f} "
+              f"{ops:>8} {size:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=ROWS)
+    parser.add_argument("--formats", nargs="+", choices=["csv", "xlsx"], default=["csv", "xlsx"])
+    parser.add_argument("--shapes", nargs="+", choices=["narrow", "wide"],
+                        default=["narrow", "wide"])
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Exit 1 if results regress against this JSON file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--run", help=argparse.SUPPRESS)  # Child process mode
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        json.dump(run_dataset(args.run, args.workdir), sys.stdout)
+        return 0
+
+    datasets = {}
+    for rows in args.rows:
+        for fmt in args.formats:
+            if fmt == "xlsx" and rows > XLSX_MAX_ROWS:
+                continue
+            for shape in args.shapes:
+                name = f"{fmt}-{shape}-{rows}"
+                # A dataset too big for this machine is recorded, not fatal
+                try:
+                    datasets[name] = run_isolated(dataset_path(rows, fmt, shape))
+                except RuntimeError as e:
+                    datasets[name] = {"error": str(e)}
+                    print(f"\n{name}: {e}")
+                    continue
+                print_results(name, datasets[name])
+
+    report = {
+        "created": time.time(),
+        "machine": machine(),
+        "datasets": datasets
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(datasets, baseline, args.threshold)
+        print(f"\n{len(regressions)} regressions against {args.compare}")
+        ours, theirs = dict(report["machine"], commit=None), dict(baseline.get("machine", {}),
+                                                                  commit=None)
+        if ours != theirs:
+            print("  (the baseline was recorded on another machine or package versions, "
+                  "so differences may not be regressions)")
+        for message in regressions:
+            print(f"  {message}")
+        return 1 if regressions else 0
+    return 1 if any("error" in result for result in datasets.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
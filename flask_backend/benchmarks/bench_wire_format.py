@@ -0,0 +1,92 @@
+"""Compare JSON and Arrow IPC responses for /get_data pages
+
+Measures payload size, server side encode time and client side decode time
+(back to the rows the Kivy table reads) per page size.
+Usage: python benchmarks/bench_wire_format.py [rows ...]   (run from flask_backend/)
+"""
+import json
+import os
+import sys
+import time
+from collections.abc import Mapping
+
+import pyarrow as pa
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import process_dataframe, compact_dtypes  # noqa: E402
+from dataset_store import iter_records, select  # noqa: E402
+from wire_format import arrow_batches  # noqa: E402
+from bench_memory import make_frame  # noqa: E402
+
+REPEAT = 5
+
+
+def encode_json(df, positions):
+    """The body /get_data streams, joined"""
+    rows = iter_records(df, positions, batch_size=500)
+    return json.dumps({"total": len(positions), "data": list(rows)}).encode()
+
+
+def encode_arrow(df, positions):
+    return b"".join(arrow_batches(select(df, positions), {"total": len(positions)}, 500))
+
+
+def decode_json(body):
+    return json.loads(body)["data"]
+
+
+class PageRow(Mapping):
+    """Copy of the Kivy client's PageRow (api_client imports kivy)"""
+    __slots__ = ("_columns", "_index")
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._columns[key][self._index]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+
+def decode_arrow(body):
+    """Same decoding as the Kivy client's read_page in flask_frontend/api_client.py"""
+    table = pa.ipc.open_stream(body).read_all()
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        columns[name] = column.to_pylist()
+    return [PageRow(columns, i) for i in range(table.num_rows)]
+
+
+def best_ms(fn, *args):
+    """Fastest of REPEAT runs, with its result"""
+    best = None
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def main(sizes):
+    df, _ = compact_dtypes(process_dataframe(make_frame(max(sizes))))
+    print(f"{'rows':>8} {'format':>6} {'bytes':>11} {'encode ms':>10} {'decode ms':>10}")
+    for rows in sizes:
+        positions = list(range(rows))
+        for name, encode, decode in (("json", encode_json, decode_json),
+                                     ("arrow", encode_arrow, decode_arrow)):
+            body, encode_ms = best_ms(encode, df, positions)
+            decoded, decode_ms = best_ms(decode, body)
+            assert len(decoded) == rows
+            print(f"{rows:>8} {name:>6} {len(body):>11,} {encode_ms:>10.1f} {decode_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [200, 5000, 100_000])
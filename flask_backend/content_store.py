@@ -0,0 +1,95 @@
+import hashlib
+import os
+import shutil
+import threading
+import uuid
+
+HASH_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class FileHashes:
+    """SHA-256 of files, cached until a file's size or mtime changes"""
+
+    def __init__(self):
+        self._hashes = {}  # path -> (size, mtime_ns, sha256)
+        self._lock = threading.Lock()
+
+    def get(self, path, stat=None):
+        stat = stat or os.stat(path)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached and cached[:2] == (stat.st_size, stat.st_mtime_ns):
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        sha = digest.hexdigest()
+        self.remember(path, sha, stat)
+        return sha
+
+    def remember(self, path, sha, stat=None):
+        """Record a hash computed elsewhere, e.g. while the file was written"""
+        stat = stat or os.stat(path)
+        with self._lock:
+            self._hashes[path] = (stat.st_size, stat.st_mtime_ns, sha)
+
+
+class ContentStore:
+    """Store uploaded files once per distinct content, keyed by SHA-256
+
+    Blobs live under blob_dir as <sha256><ext>. Each uploaded filename in
+    folder is a hard link to its blob, so re-uploading identical content
+    (under any name) doesn't write it again.
+    """
+
+    def __init__(self, folder, blob_dir):
+        self.folder = folder
+        self.blob_dir = blob_dir
+        self.hashes = FileHashes()
+        self._lock = threading.Lock()
+        os.makedirs(blob_dir, exist_ok=True)
+
+    def save(self, stream, filename):
+        """Write an upload stream under filename, hashing it as it streams in
+
+        Returns (sha256, duplicate) where duplicate means the content was
+        already stored.
+        """
+        ext = os.path.splitext(filename)[1].lower()
+        tmp_path = os.path.join(self.blob_dir, f".{uuid.uuid4().hex}.part")
+        digest = hashlib.sha256()
+        with open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: stream.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        sha = digest.hexdigest()
+
+        blob_path = os.path.join(self.blob_dir, sha + ext)
+        duplicate = os.path.exists(blob_path)
+        if duplicate:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob_path)
+
+        target = os.path.join(self.folder, filename)
+        with self._lock:
+            if not (os.path.exists(target) and os.path.samefile(target, blob_path)):
+                link_or_copy(blob_path, target)
+            self.hashes.remember(target, sha)
+        return sha, duplicate
+
+    def content_hash(self, path):
+        """SHA-256 of a file, cached until its size or mtime changes"""
+        return self.hashes.get(path)
+
+
+def link_or_copy(source, target):
+    """Point target at source's data, copying when hard links aren't supported"""
+    tmp_target = f"{target}.{uuid.uuid4().hex}.tmp"
+    try:
+        os.link(source, tmp_target)
+    except OSError:
+        shutil.copyfile(source, tmp_target)
+    os.replace(tmp_target, target)
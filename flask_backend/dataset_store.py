@@ -0,0 +1,646 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype
+from pyarrow import feather
+
+TOUCH_INTERVAL = 60  # Seconds between marking a dataset used on disk, for sweep()
+ORPHAN_AGE = 60 * 60  # Seconds before files no catalog record owns are deleted
+
+
+def frame_records(df):
+    """Turn a DataFrame slice into JSON ready row dicts"""
+    return df.to_dict(orient="records")
+
+
+class _Entry:
+    """A resident dataset and its bookkeeping"""
+    __slots__ = ("frame", "pending", "nbytes", "last_access", "pinned", "on_disk",
+                 "derived", "derived_nbytes", "version", "touched")
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.pending = []  # appended chunks not yet folded into frame
+        self.nbytes = frame_nbytes(frame)
+        self.last_access = time.monotonic()
+        self.pinned = False  # set when the frame can't be spilled
+        self.on_disk = False  # set when an up to date spill file exists
+        self.derived = {}  # indexes and caches built from frame, dropped with it
+        self.derived_nbytes = 0
+        self.version = None  # signature of the shared file frame matches
+        self.touched = None  # last_access when the catalog record was last touched
+
+    def consolidate(self):
+        """Fold appended chunks into frame"""
+        if self.pending:
+            self.frame = pd.concat([self.frame] + self.pending, ignore_index=True)
+            self.pending = []
+
+
+class DatasetStore:
+    """Keep each processed upload as a DataFrame and build rows only on demand
+
+    Resident frames are bounded by memory_budget bytes and evicted least
+    recently used first, or once idle for ttl seconds. Evicted frames are
+    spilled to Feather files under spill_dir and reloaded on next access.
+
+    With persistent=True every stored frame is written through to spill_dir,
+    and datasets recorded with describe() form a catalog that outlives the
+    process: its metadata is read at startup, frames on first access.
+
+    shared=True implies persistent, for several server processes using the
+    same datasets: a process loads any file_id it finds in spill_dir, and
+    reloads its copy when another process has rewritten the file.
+
+    Files on disk are only deleted by sweep(): catalogued datasets unused
+    for retention seconds or beyond disk_budget bytes, and orphaned files.
+    """
+
+    def __init__(self, spill_dir=None, memory_budget=None, ttl=None, shared=False,
+                 persistent=False, disk_budget=None, retention=None):
+        if (shared or persistent) and not spill_dir:
+            raise ValueError("A shared or persistent store needs a spill_dir")
+        self.spill_dir = spill_dir
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.shared = shared
+        self.persistent = persistent or shared
+        self.disk_budget = disk_budget
+        self.retention = retention
+        self._entries = OrderedDict()  # file_id -> _Entry, least recent first
+        self._spilled = {}  # file_id -> spill file path
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        self.counters = {name: 0 for name in
+                         ("hits", "misses", "evictions", "expirations",
+                          "spills", "spill_errors", "reloads", "deletions")}
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+        self._catalog = load_catalog(spill_dir) if self.persistent else {}  # file_id -> metadata
+
+    def __contains__(self, file_id):
+        with self._lock:
+            if file_id in self._entries or file_id in self._spilled or file_id in self._catalog:
+                return True
+        return self.shared and os.path.exists(self._spill_path(file_id))
+
+    def __len__(self):
+        with self._lock:
+            return len(set(self._entries) | set(self._spilled) | set(self._catalog))
+
+    def put(self, file_id, df):
+        """Store a processed frame under file_id
+
+        Replacing a dataset keeps its catalog record until the next describe().
+        """
+        # Positional row ids make slicing and index lookups cheap
+        df = df.reset_index(drop=True)
+        with self._lock:
+            self._forget(file_id)
+            entry = _Entry(df)
+            self._insert(file_id, entry)
+            # The new file replaces any old one in a single rename, so other
+            # processes never find the dataset missing in between
+            if not self._publish(file_id, entry):
+                self._remove_files(file_id)
+            self._expire()
+            self._enforce_budget(keep=file_id)
+        return df
+
+    def get(self, file_id):
+        """Return the stored frame or None, reloading it from disk if spilled"""
+        with self._lock:
+            self._expire()
+            entry = self._entries.get(file_id)
+            if entry is not None and self.shared and self._is_stale(file_id, entry):
+                # Another process rewrote the dataset, drop our copy
+                self._entries.pop(file_id)
+                self._resident_bytes -= entry.nbytes
+                entry = None
+            if entry is not None:
+                self.counters["hits"] += 1
+                entry.last_access = time.monotonic()
+                self._entries.move_to_end(file_id)
+                self._touch(file_id, entry)
+                entry.consolidate()
+                return entry.frame
+
+            path = self._spilled.pop(file_id, None)
+            if path is None and (self.shared or file_id in self._catalog):
+                path = self._spill_path(file_id)
+            if path is None:
+                return None
+            version = file_version(path)
+            if version is None:
+                return None
+
+            self.counters["misses"] += 1
+            df = read_spill(path)
+            self.counters["reloads"] += 1
+            entry = _Entry(df)
+            entry.on_disk = True
+            entry.version = version
+            self._insert(file_id, entry)
+            self._touch(file_id, entry)
+            self._enforce_budget(keep=file_id)
+            return df
+
+    def derived(self, file_id, key, build):
+        """Return build(frame), computed once per resident copy of the dataset
+
+        The value lives as long as the frame stays in memory, and its nbytes
+        (when it has one) counts against the memory budget. Values that grow
+        after they are built, like an LRUCache of results, report it through
+        their on_resize attribute.
+        """
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is not None and key in entry.derived:
+                return entry.derived[key]
+            df = None
+            if entry is not None:
+                entry.consolidate()
+                df = entry.frame
+        if df is None:
+            df = self.get(file_id)
+            if df is None:
+                return None
+        value = build(df)
+        with self._lock:
+            entry = self._entries.get(file_id)
+            # Only cache against the frame the value was built from
+            if entry is not None and entry.frame is df and key not in entry.derived:
+                entry.derived[key] = value
+                if hasattr(value, "on_resize"):
+                    value.on_resize = lambda delta: self._derived_resized(file_id, key, value,
+                                                                          delta)
+                size = int(getattr(value, "nbytes", 0))
+                entry.derived_nbytes += size
+                self._resize(entry, size)
+                self._enforce_budget(keep=file_id)
+        return value
+
+    def append(self, file_id, chunk):
+        """Add rows to the end of a dataset, creating it if needed
+
+        Chunks are only concatenated when the frame is next read, so
+        appending stays cheap while a file is being ingested. Derived values
+        are dropped since they no longer cover every row.
+        """
+        with self._lock:
+            if file_id in self._spilled:
+                self.get(file_id)
+            entry = self._entries.get(file_id)
+            if entry is None:
+                self.put(file_id, chunk)
+                return
+            entry.pending.append(chunk)
+            entry.on_disk = False
+            self._clear_derived(entry)
+            self._resize(entry, frame_nbytes(chunk))
+            self._enforce_budget(keep=file_id)
+
+    def update(self, file_id, column, positions, values):
+        """Overwrite cells of one column, returning False for unknown datasets
+
+        Readers still holding the previous frame keep a consistent view, and
+        derived values are rebuilt against the new one.
+        """
+        with self._lock:
+            df = self.get(file_id)
+            if df is None:
+                return False
+            entry = self._entries[file_id]
+            if column in df.columns:
+                series = df[column]
+            else:
+                series = pd.Series(np.nan, index=df.index, dtype=object, name=column)
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                # New values become categories, so the column stays compact
+                new = pd.Index(values).unique().difference(series.cat.categories)
+                series = series.cat.add_categories(new)
+            else:
+                series = series.astype(object)
+            series.iloc[positions] = values
+
+            df = df.copy(deep=False)
+            df[column] = series
+            entry.frame = df
+            entry.on_disk = False
+            self._clear_derived(entry)
+            self._publish(file_id, entry)
+            nbytes = frame_nbytes(df)
+            self._resize(entry, nbytes - entry.nbytes)
+            self._enforce_budget(keep=file_id)
+            return True
+
+    def describe(self, file_id, **meta):
+        """Record a complete dataset in the catalog, with extra metadata
+
+        Returns the catalog record, or None for unknown datasets. Persistent
+        stores keep it next to the frame, so the dataset survives restarts.
+        """
+        df = self.get(file_id)
+        if df is None:
+            return None
+        with self._lock:
+            record = dict(self._catalog.get(file_id, {}), **meta)
+            record.update(file_id=file_id, rows=len(df),
+                          columns={col: str(dtype) for col, dtype in df.dtypes.items()},
+                          updated=time.time())
+            self._catalog[file_id] = record
+            # Frames Arrow couldn't write stay out of the on-disk catalog
+            if self.persistent and file_version(self._spill_path(file_id)) is not None:
+                write_json(self._meta_path(file_id), record)
+        return record
+
+    def metadata(self, file_id, refresh=False):
+        """Catalog record of a dataset, without loading its frame
+
+        refresh=True rereads a shared store's record, which another process
+        may have rewritten with describe() since.
+        """
+        with self._lock:
+            record = self._catalog.get(file_id)
+        if self.shared and (record is None or refresh):
+            # Possibly catalogued by another process since we started
+            record = read_json(self._meta_path(file_id)) or record
+            if record is not None:
+                with self._lock:
+                    self._catalog[file_id] = record
+        return record
+
+    def catalog(self):
+        """Catalog records of every described dataset"""
+        with self._lock:
+            return list(self._catalog.values())
+
+    def refresh_catalog(self):
+        """Catalog records other processes have added since, for shared stores"""
+        if not self.shared:
+            return []
+        with self._lock:
+            known = set(self._catalog)
+        added = load_catalog(self.spill_dir, skip=known)
+        with self._lock:
+            for file_id, record in added.items():
+                self._catalog.setdefault(file_id, record)
+        return list(added.values())
+
+    def delete(self, file_id):
+        with self._lock:
+            self._drop(file_id)
+
+    def sweep(self, keep=None, orphan_age=ORPHAN_AGE):
+        """Delete datasets unused for retention seconds or beyond disk_budget, and orphaned files
+
+        Catalogued datasets are ranked by last use, the mtime of their
+        catalog record, which get() touches; keep is never deleted. Files no
+        catalog record owns, left by an interrupted chunked ingest or write,
+        are deleted once orphan_age seconds old, so files another process
+        is still writing survive. Returns the file_ids of deleted datasets.
+        """
+        if not self.persistent:
+            return []
+        stats = {}
+        with os.scandir(self.spill_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stats[entry.name] = entry.stat()
+                except FileNotFoundError:
+                    continue  # Deleted by another process meanwhile
+        now = time.time()
+        last_used, sizes, orphans = {}, {}, []
+        for name, stat in stats.items():
+            file_id, ext = os.path.splitext(name)
+            if ext == ".json" and f"{file_id}.feather" in stats:
+                last_used[file_id] = stat.st_mtime
+                sizes[file_id] = stat.st_size + stats[f"{file_id}.feather"].st_size
+            elif ext == ".feather" and f"{file_id}.json" in stats:
+                continue
+            elif now - stat.st_mtime > orphan_age:
+                orphans.append(name)
+
+        deleted = []
+        total = sum(sizes.values())
+        for used, file_id in sorted((used, file_id) for file_id, used in last_used.items()):
+            expired = self.retention and now - used > self.retention
+            over_budget = self.disk_budget and total > self.disk_budget
+            if file_id != keep and (expired or over_budget):
+                deleted.append(file_id)
+                total -= sizes[file_id]
+        with self._lock:
+            for file_id in deleted:
+                self._drop(file_id)
+                self.counters["deletions"] += 1
+            # Uncatalogued datasets this process holds, such as an ingest, aren't orphans
+            live = set(self._entries) | set(self._spilled)
+            for name in orphans:
+                if name.split(".", 1)[0] not in live:
+                    remove_file(os.path.join(self.spill_dir, name))
+        return deleted
+
+    def memory_usage(self, file_id=None):
+        """Resident bytes held by one dataset, or by all of them"""
+        with self._lock:
+            if file_id is None:
+                return self._resident_bytes
+            entry = self._entries.get(file_id)
+            return entry.nbytes if entry else 0
+
+    def stats(self):
+        """Cache counters and current occupancy"""
+        with self._lock:
+            return dict(self.counters,
+                        resident_datasets=len(self._entries),
+                        spilled_datasets=len(self._spilled),
+                        catalogued_datasets=len(self._catalog),
+                        resident_bytes=self._resident_bytes,
+                        memory_budget=self.memory_budget,
+                        ttl=self.ttl)
+
+    def _resize(self, entry, delta):
+        entry.nbytes += delta
+        self._resident_bytes += delta
+
+    def _derived_resized(self, file_id, key, value, delta):
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry is None or entry.derived.get(key) is not value:
+                return  # Dropped along with its frame since
+            entry.derived_nbytes += delta
+            self._resize(entry, delta)
+            self._enforce_budget(keep=file_id)
+
+    def _clear_derived(self, entry):
+        entry.derived.clear()
+        self._resize(entry, -entry.derived_nbytes)
+        entry.derived_nbytes = 0
+
+    def _insert(self, file_id, entry):
+        self._entries[file_id] = entry
+        self._resident_bytes += entry.nbytes
+
+    def _drop(self, file_id):
+        self._forget(file_id)
+        self._remove_files(file_id)
+
+    def _forget(self, file_id):
+        """Drop the resident copy of a dataset, leaving its files on disk"""
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self._resident_bytes -= entry.nbytes
+        self._spilled.pop(file_id, None)
+
+    def _remove_files(self, file_id):
+        self._catalog.pop(file_id, None)
+        for path in (self._spill_path(file_id), self._meta_path(file_id)):
+            if path:
+                remove_file(path)
+
+    def _touch(self, file_id, entry):
+        """Mark a catalogued dataset used, for sweeps by any process"""
+        if not self.persistent:
+            return
+        if entry.touched is not None and entry.last_access - entry.touched < TOUCH_INTERVAL:
+            return
+        entry.touched = entry.last_access
+        try:
+            os.utime(self._meta_path(file_id))
+        except OSError:
+            pass  # Not catalogued (yet)
+
+    def _expire(self):
+        if not self.ttl:
+            return
+        cutoff = time.monotonic() - self.ttl
+        for file_id, entry in list(self._entries.items()):
+            if entry.last_access > cutoff:
+                break
+            if self._evict(file_id):
+                self.counters["expirations"] += 1
+
+    def _enforce_budget(self, keep=None):
+        if not self.memory_budget:
+            return
+        for file_id in list(self._entries):
+            if self._resident_bytes <= self.memory_budget:
+                break
+            if file_id != keep:
+                self._evict(file_id)
+
+    def _evict(self, file_id):
+        """Spill a resident frame to disk, leaving it resident if that fails"""
+        entry = self._entries[file_id]
+        path = self._spill_path(file_id)
+        if path is None or entry.pinned:
+            return False
+        try:
+            if not entry.on_disk:
+                entry.consolidate()
+                write_spill(entry.frame, path)
+        except Exception:
+            # Frames Arrow can't represent (e.g. mixed type columns) stay in memory
+            self.counters["spill_errors"] += 1
+            entry.pinned = True
+            return False
+        del self._entries[file_id]
+        self._resident_bytes -= entry.nbytes
+        self._spilled[file_id] = path
+        self.counters["spills"] += 1
+        self.counters["evictions"] += 1
+        return True
+
+    def _publish(self, file_id, entry):
+        """Write a frame through to disk so it outlives this process, returning whether it was"""
+        if not self.persistent:
+            return False
+        path = self._spill_path(file_id)
+        entry.consolidate()
+        try:
+            write_spill(entry.frame, path)
+        except Exception:
+            # Frames Arrow can't represent stay private to this process
+            self.counters["spill_errors"] += 1
+            entry.pinned = True
+            return False
+        entry.on_disk = True
+        entry.version = file_version(path)
+        return True
+
+    def _is_stale(self, file_id, entry):
+        if entry.version is None:
+            return False  # Not published yet, e.g. mid ingest
+        version = file_version(self._spill_path(file_id))
+        return version is not None and version != entry.version
+
+    def _spill_path(self, file_id):
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{file_id}.feather")
+
+    def _meta_path(self, file_id):
+        if not self.spill_dir:
+            return None
+        return os.path.join(self.spill_dir, f"{file_id}.json")
+
+
+def frame_nbytes(df):
+    """Bytes used by a frame, including string payloads"""
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def file_version(path):
+    """Signature that changes whenever path is replaced, None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def load_catalog(folder, skip=()):
+    """Catalog records of the datasets stored under folder, except those in skip"""
+    catalog = {}
+    for name in os.listdir(folder):
+        file_id, ext = os.path.splitext(name)
+        if ext != ".json" or file_id in skip:
+            continue
+        if not os.path.exists(os.path.join(folder, f"{file_id}.feather")):
+            continue
+        record = read_json(os.path.join(folder, name))
+        if record is not None:
+            catalog[file_id] = record
+    return catalog
+
+
+def remove_file(path):
+    """Delete path if it still exists, as another process may have got there first"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def write_json(path, value):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f, default=str)
+    os.replace(tmp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_spill(df, path):
+    """Write a frame to a Feather (Arrow IPC) file atomically
+
+    Files are uncompressed so readers can memory map them instead of
+    decompressing into private memory.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        df.to_feather(tmp_path, compression="uncompressed")
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, path)
+
+
+def read_spill(path):
+    """Load a spilled frame back from its memory mapped file
+
+    Numeric columns without missing values, and the codes of categoricals,
+    stay read-only views of the mapping, living in the page cache that every
+    process reading the file shares. Text and columns with missing values
+    are converted into private memory, a column at a time so the Arrow
+    buffers are released as they go. The memory budget still counts the
+    whole frame, since mapped pages are resident while in use.
+    """
+    df = feather.read_table(path, memory_map=True).to_pandas(split_blocks=True,
+                                                              self_destruct=True)
+    # Arrow turns missing text into None, keep the NaN the frame was stored with;
+    # only the pointer array is rebuilt, the strings themselves are not copied
+    for col in df.columns[df.dtypes == object]:
+        if df[col].hasnans:
+            df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+
+def records(df, positions=None, columns=None):
+    """Materialize rows at the given positions (all rows by default)"""
+    return frame_records(select(df, positions, columns))
+
+
+def iter_records(df, positions=None, columns=None, batch_size=500):
+    """Yield rows one at a time, materializing batch_size rows at once"""
+    if positions is None:
+        positions = np.arange(len(df))
+    for start in range(0, len(positions), batch_size):
+        batch = select(df, positions[start:start + batch_size], columns)
+        yield from frame_records(batch)
+
+
+def select(df, positions=None, columns=None):
+    """Project columns and take rows by position"""
+    if columns is not None:
+        df = df[columns]
+    if positions is not None:
+        df = df.iloc[positions]
+    return df
+
+
+def sort_positions(df, column, descending=False):
+    """Row positions of df ordered by column, missing values last, ties in row order
+
+    One stable argsort over the present values (NumPy's, for NumPy backed
+    columns); descending sorts the values reversed so ties keep row order.
+    """
+    series = df[column]
+    missing = series.isna().to_numpy()
+    present = np.flatnonzero(~missing)
+    values = series.iloc[present]
+    if isinstance(values.dtype, pd.CategoricalDtype) and not values.cat.ordered:
+        values = category_ranks(values)
+    elif infer_dtype(values, skipna=True).startswith("mixed"):
+        values = values.astype(str)  # Mixed types order as text
+    if descending:
+        order = len(values) - 1 - values.iloc[::-1].argsort(kind="stable").to_numpy()[::-1]
+    else:
+        order = values.argsort(kind="stable").to_numpy()
+    positions = np.concatenate([present[order], np.flatnonzero(missing)])
+    return positions.astype(np.int32) if len(positions) < 2 ** 31 else positions
+
+
+def category_ranks(values):
+    """Each value's rank among the categories, ordered by value
+
+    Codes follow the order categories were added in, which update() makes
+    arbitrary, so they can't be sorted on directly.
+    """
+    categories = values.cat.categories
+    if infer_dtype(categories).startswith("mixed"):
+        categories = categories.astype(str)  # Mixed types order as text
+    ranks = np.empty(len(categories), dtype=np.int64)
+    ranks[categories.argsort(kind="stable")] = np.arange(len(categories))
+    return pd.Series(ranks[values.cat.codes.to_numpy()])
+
+
+def missing_columns(df, columns):
+    """Requested columns that are not in df"""
+    if columns is None:
+        return []
+    return [col for col in columns if col not in df.columns]
@@ -0,0 +1,17 @@
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Threads keep streamed pages and long polled /jobs requests from tying up a worker
+worker_class = "gthread"
+threads = int(os.environ.get("THREADS", 4))
+timeout = 120
+
+# Workers share datasets through uploads/datasets, and split the CPUs
+# between their parsing pools instead of each starting one per core
+os.environ.setdefault("SHARED_STATE", "1")
+os.environ.setdefault("PROCESS_WORKERS", str(max(1, multiprocessing.cpu_count() // workers)))
+# Each worker keeps its own resident frames, so they split the memory budget too
+memory_budget = int(os.environ.get("SERVER_MEMORY_BUDGET", 512 * 1024 * 1024))  # 512MB
+os.environ.setdefault("DATASET_MEMORY_BUDGET", str(memory_budget // workers))
@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import uuid
+import zipfile
+
+from werkzeug.utils import secure_filename
+
+WRITE_CHUNK_SIZE = 1024 * 1024  # 1MB
+MANIFEST_NAME = "manifest.json"
+HASH_PREFIX = 16  # Hex digits of the SHA-256 in stored image names
+
+
+class BatchError(ValueError):
+    """A batch upload that can't be read at all"""
+
+
+class BatchFile:
+    """One image of a batch, read lazily from a multipart part or zip member"""
+
+    def __init__(self, name, size, opener):
+        self.name = name  # as sent by the client, used to look up the manifest
+        self.size = size  # None when unknown up front
+        self.open = opener
+        self.status = {"filename": name}
+
+
+def multipart_files(files):
+    """BatchFiles for the uploaded parts, which are already spooled by werkzeug"""
+    return [BatchFile(part.filename, None, lambda part=part: part.stream)
+            for part in files if part.filename]
+
+
+def zip_files(archive):
+    """BatchFiles for the images in a zip, plus its manifest.json if it has one
+
+    Directory entries and macOS resource forks are skipped.
+    """
+    try:
+        bundle = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile:
+        raise BatchError("Archive is not a valid zip file")
+
+    batch, manifest = [], None
+    for member in bundle.infolist():
+        name = member.filename
+        if member.is_dir() or name.startswith("__MACOSX/"):
+            continue
+        if os.path.basename(name) == MANIFEST_NAME:
+            manifest = parse_manifest(bundle.read(member))
+            continue
+        batch.append(BatchFile(os.path.basename(name), member.file_size,
+                               lambda member=member: bundle.open(member)))
+    return batch, manifest
+
+
+def parse_manifest(raw):
+    """Map of image filename to the row positions it belongs to
+
+    The manifest is a JSON object {"shoe.jpg": 3, "hat.png": [7, 12]}.
+    """
+    try:
+        manifest = json.loads(raw)
+    except ValueError:
+        raise BatchError("Manifest is not valid JSON")
+    if not isinstance(manifest, dict):
+        raise BatchError("Manifest must map image filenames to rows")
+
+    rows = {}
+    for name, positions in manifest.items():
+        if not isinstance(positions, list):
+            positions = [positions]
+        if not all(isinstance(p, int) and not isinstance(p, bool) for p in positions):
+            raise BatchError(f"Rows for {name} must be integers")
+        rows[name] = positions
+    return rows
+
+
+def manifest_rows(manifest, batch_file):
+    """Rows for an image, matching either its sent or its stored filename"""
+    if not manifest:
+        return []
+    rows = manifest.get(batch_file.name)
+    if rows is None:
+        rows = manifest.get(secure_filename(batch_file.name), [])
+    return rows
+
+
+def stored_name(file_id, name, sha):
+    """Uploads are named {file_id}__{hash prefix}__name, so a URL never changes content"""
+    return f"{file_id}__{sha[:HASH_PREFIX]}__{name}"
+
+
+def names_content(filename, sha):
+    """Whether a stored filename embeds the hash of the content it holds"""
+    return f"__{sha[:HASH_PREFIX]}__" in filename
+
+
+def write_image(source, folder, file_id, name):
+    """Copy an image stream into folder atomically under its stored_name
+
+    Returns the stored filename and the image's SHA-256.
+    """
+    tmp_path = os.path.join(folder, f".{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    try:
+        with open(tmp_path, "wb") as out:
+            for chunk in iter(lambda: source.read(WRITE_CHUNK_SIZE), b""):
+                digest.update(chunk)
+                out.write(chunk)
+        sha = digest.hexdigest()
+        filename = stored_name(file_id, name, sha)
+        os.replace(tmp_path, os.path.join(folder, filename))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename, sha
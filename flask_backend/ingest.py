@@ -0,0 +1,200 @@
+import time
+
+import numpy as np
+import pandas as pd
+from pandas._libs.parsers import STR_NA_VALUES
+from pandas.api import types
+
+from xlsx_reader import Workbook
+
+IMAGE_URL_PREFIX = "http://127.0.0.1:5000/get_image/"
+SAMPLE_IMAGE_URLS = [f"{IMAGE_URL_PREFIX}sample{i}.jpg" for i in range(1, 6)]
+
+# Text columns with at most this many distinct values per row become categorical
+CATEGORY_MAX_RATIO = 0.5
+
+
+def find_image_column(df):
+    """Find column that might contain image URLs"""
+    for col in df.columns:
+        if any(word in col.lower() for word in ['image', 'url', 'img']):
+            return col
+    return None
+
+
+def format_image_url(url):
+    """Format image URL to ensure proper structure"""
+    if not url or not isinstance(url, str):
+        return url
+    if url.startswith(('http://', 'https://')):
+        return url
+    return f"{IMAGE_URL_PREFIX}{url.split('/')[-1]}"
+
+
+def format_image_urls(urls):
+    """format_image_url over a whole column, once per distinct value
+
+    Image columns repeat values heavily, so factorizing and rewriting the
+    uniques beats both a per-row apply and chained .str operations.
+    """
+    codes, uniques = pd.factorize(urls)
+    formatted = [format_image_url(url) for url in uniques]
+    formatted.append(np.nan)  # code -1 marks missing cells
+    return pd.Series(np.asarray(formatted, dtype=object)[codes], index=urls.index,
+                     name=urls.name)
+
+
+def sample_image_urls(row_offset, count):
+    """Cycle through the sample images, as a compact categorical column"""
+    codes = np.arange(row_offset, row_offset + count) % len(SAMPLE_IMAGE_URLS)
+    return pd.Categorical.from_codes(codes, categories=SAMPLE_IMAGE_URLS)
+
+
+def process_dataframe(df, row_offset=0):
+    """Process dataframe to standardize column names and handle image URLs
+
+    row_offset is the position of df's first row in the whole file, so chunks
+    of one file get the same sample images the file would as a whole.
+    """
+    # Convert columns to lowercase
+    df.columns = df.columns.str.lower()
+
+    # Handle image column
+    image_col = find_image_column(df)
+    if image_col:
+        df.rename(columns={image_col: 'image_url'}, inplace=True)
+        df['image_url'] = format_image_urls(df['image_url'])
+    else:
+        # Add sample images if no image column exists
+        df['image_url'] = sample_image_urls(row_offset, len(df))
+
+    return df
+
+
+def is_text_dtype(dtype):
+    return dtype == object or isinstance(dtype, pd.StringDtype)
+
+
+def compact_dtypes(df):
+    """Shrink column dtypes without changing any value
+
+    Integers are downcast, floats go to float32 only when every value
+    survives the round trip, and low-cardinality text becomes categorical.
+    Returns the frame and a report of the bytes saved.
+    """
+    before = int(df.memory_usage(index=True, deep=True).sum())
+    changed = {}
+    for col in df.columns:
+        series = df[col]
+        if types.is_bool_dtype(series.dtype):
+            continue
+        if types.is_integer_dtype(series.dtype):
+            compact = pd.to_numeric(series, downcast='integer')
+        elif types.is_float_dtype(series.dtype):
+            compact = series.astype(np.float32)
+            if not ((compact == series) | series.isna()).all():
+                continue
+        elif is_text_dtype(series.dtype) and len(series):
+            if series.nunique(dropna=False) > CATEGORY_MAX_RATIO * len(series):
+                continue
+            compact = series.astype('category')
+        else:
+            continue
+        if compact.dtype != series.dtype:
+            df[col] = compact
+            changed[col] = str(compact.dtype)
+
+    after = int(df.memory_usage(index=True, deep=True).sum())
+    return df, {
+        "bytes_before": before,
+        "bytes_after": after,
+        "bytes_saved": before - after,
+        "columns": changed
+    }
+
+
+def excel_sheet_names(filepath):
+    """Sheet names of a workbook, in workbook order"""
+    with Workbook(filepath) as workbook:
+        return workbook.sheet_names
+
+
+def read_excel_sheet(filepath, sheet=None):
+    """Read one sheet (the first by default) of an .xlsx file into a frame
+
+    Like pd.read_excel, the first row is the header even when blank, blank
+    trailing rows are dropped and unnamed header cells, including the empty
+    columns left of a table that starts further in, become "Unnamed:
+    <position>"; but the sheet XML is parsed directly rather than through
+    openpyxl cells.
+    """
+    with Workbook(filepath) as workbook:
+        rows = workbook.rows(sheet)
+        header = next(rows, None)
+        data = list(rows)
+    if header is None:
+        return pd.DataFrame()
+
+    while data and all(value is None for value in data[-1]):
+        data.pop()
+    width = max(map(len, data), default=0)
+    header = header + [None] * (width - len(header))
+    columns = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+    for row in data:
+        if len(row) < len(columns):
+            row.extend([None] * (len(columns) - len(row)))
+    df = pd.DataFrame.from_records(data, columns=columns) if data else pd.DataFrame(columns=columns)
+    # Sheets often carry formatted but empty cells right of the table
+    width = len(columns)
+    while width and header[width - 1] is None and df.iloc[:, width - 1].isna().all():
+        width -= 1
+    df = df.iloc[:, :width] if width < len(columns) else df
+
+    # As in read_excel, blank cells and its default na_values ("NA", "#N/A",
+    # "null"...) below the header are NaN, and wholly missing columns (say,
+    # uncalculated formulas) are float. Columns go by position, names may repeat
+    cleaned = []
+    changed = False
+    for i in range(df.shape[1]):
+        values = df.iloc[:, i]
+        if types.is_string_dtype(values.dtype):
+            missing = (values.isna() | values.isin(STR_NA_VALUES)).to_numpy()
+            if missing.all():
+                values = pd.Series(np.nan, index=values.index, name=values.name)
+            elif missing.any():
+                values = values.mask(missing)
+            changed = changed or missing.any()
+        cleaned.append(values)
+    return pd.concat(cleaned, axis=1) if changed else df
+
+
+def read_table(filepath, sheet=None):
+    """Read a whole CSV file, or one sheet of an Excel file"""
+    if filepath.endswith('.csv'):
+        return pd.read_csv(filepath)
+    return read_excel_sheet(filepath, sheet)
+
+
+def load_dataset(filepath, sheet=None):
+    """Read, process and compact a whole file; runs in a worker process
+
+    Returns the frame, its compact_dtypes memory report and the seconds
+    spent in each phase, for the server's metrics.
+    """
+    start = time.perf_counter()
+    df = read_table(filepath, sheet)
+    phases = {"parse": time.perf_counter() - start}
+    if df.empty:
+        return df, None, phases
+    start = time.perf_counter()
+    df, memory_report = compact_dtypes(process_dataframe(df))
+    phases["transform"] = time.perf_counter() - start
+    return df, memory_report, phases
+
+
+def iter_csv_chunks(filepath, chunksize):
+    """Yield (row_offset, processed chunk) pairs from a CSV file"""
+    row_offset = 0
+    for chunk in pd.read_csv(filepath, chunksize=chunksize):
+        yield row_offset, process_dataframe(chunk, row_offset)
+        row_offset += len(chunk)
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+PENDING = ("queued", "running")
+FINISH_THREADS = 2  # Threads running on_done, e.g. storing parsed frames
+
+
+class QueueFull(Exception):
+    """Raised when max_pending jobs are already queued or running"""
+
+
+def timed_call(fn, *args):
+    """Run fn in a worker process, returning its result and wall clock span"""
+    started = time.time()
+    result = fn(*args)
+    return result, started, time.time()
+
+
+class Job:
+    """A unit of work submitted to the queue and its timing"""
+
+    def __init__(self, key=None):
+        self.id = str(uuid.uuid4())
+        self.key = key
+        self.status = "queued"
+        self.result = None
+        self.error = None
+        self.queued_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = None
+        self.done = threading.Event()
+
+    def finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished_at = self.finished_at or time.time()
+        self.done.set()
+
+    def to_dict(self):
+        if self.status == "queued" and self.future is not None and self.future.running():
+            self.status = "running"
+        data = {
+            "job_id": self.id,
+            "status": self.status,
+            "queued_at": self.queued_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error
+        }
+        if self.started_at:
+            data["queue_seconds"] = round(self.started_at - self.queued_at, 4)
+            if self.finished_at:
+                data["run_seconds"] = round(self.finished_at - self.started_at, 4)
+        return data
+
+
+class JobQueue:
+    """Run CPU bound work on a process pool and track it by job id
+
+    on_done(job, value) runs in the parent once a worker returns, on a thread
+    of its own rather than the pool's manager thread, which must stay free to
+    hand out work and collect results; its return value becomes the job's
+    result. on_change(job) runs whenever a job is queued or finishes. Jobs
+    still pending after timeout seconds are reported as timed out; the
+    worker can't be interrupted, so its eventual result is discarded.
+    """
+
+    def __init__(self, max_workers=None, max_pending=32, timeout=300, retention=3600,
+                 on_change=None):
+        self.max_workers = max_workers or os.cpu_count()
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.retention = retention
+        self.on_change = on_change
+        self._executor = None
+        self._finisher = ThreadPoolExecutor(max_workers=FINISH_THREADS,
+                                            thread_name_prefix="job-finish")
+        self._jobs = {}
+        self._by_key = {}  # key -> pending job, so identical work is queued once
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args, key=None, on_done=None):
+        """Queue fn(*args) on the pool, returning the Job"""
+        with self._lock:
+            self._prune()
+            existing = self._by_key.get(key) if key is not None else None
+            if existing is not None and existing.status in PENDING:
+                return existing
+            if self._pending() >= self.max_pending:
+                raise QueueFull(f"{self.max_pending} jobs already pending")
+
+            job = Job(key)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._by_key[key] = job
+            try:
+                future = self._pool().submit(timed_call, fn, *args)
+            except BrokenProcessPool:
+                # A worker died, start a fresh pool
+                self._executor = None
+                future = self._pool().submit(timed_call, fn, *args)
+            job.future = future
+        self._changed(job)
+        future.add_done_callback(
+            lambda f: self._finisher.submit(self._complete, job, f, on_done))
+        return job
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is not None:
+            self._check_timeout(job)
+        return job
+
+    def wait(self, job_id, timeout):
+        """Block up to timeout seconds for a job to finish (long polling)"""
+        job = self.get(job_id)
+        if job is not None and job.status in PENDING and timeout > 0:
+            deadline = job.queued_at + self.timeout if self.timeout else None
+            if deadline:
+                timeout = max(0, min(timeout, deadline - time.time()))
+            job.done.wait(timeout)
+            self._check_timeout(job)
+        return job
+
+    def pending(self):
+        with self._lock:
+            return self._pending()
+
+    def stats(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "timeout": self.timeout,
+            "jobs": counts
+        }
+
+    def _pending(self):
+        """Jobs queued or running; the caller holds the lock, as submit and _prune change _jobs"""
+        return sum(1 for job in self._jobs.values() if job.status in PENDING)
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def _complete(self, job, future, on_done):
+        if job.status not in PENDING:
+            return  # timed out already
+        try:
+            value, job.started_at, job.finished_at = future.result()
+            result = on_done(job, value) if on_done else value
+            job.finish("done", result=result)
+        except Exception as e:
+            job.finish("failed", error=str(e))
+        self._changed(job)
+
+    def _check_timeout(self, job):
+        if self.timeout and job.status in PENDING and time.time() - job.queued_at > self.timeout:
+            job.finish("timed_out", error=f"Job exceeded {self.timeout}s")
+            self._changed(job)
+
+    def _changed(self, job):
+        if self.on_change is not None:
+            self.on_change(job)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished_at and job.finished_at < cutoff:
+                del self._jobs[job_id]
+                if self._by_key.get(job.key) is job:
+                    del self._by_key[job.key]
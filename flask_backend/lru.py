@@ -0,0 +1,66 @@
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """A small thread-safe mapping that forgets its least recently used keys
+
+    nbytes totals the values that have one (numpy arrays, say), and
+    on_resize(delta) is called whenever it changes, e.g. so a memory budget
+    can count what the cache holds.
+    """
+
+    def __init__(self, maxsize=128, on_resize=None):
+        self.maxsize = maxsize
+        self.on_resize = on_resize
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            before = self.nbytes
+            self.nbytes -= _nbytes(self._data.pop(key, None))
+            self._data[key] = value
+            self.nbytes += _nbytes(value)
+            while len(self._data) > self.maxsize:
+                self.nbytes -= _nbytes(self._data.popitem(last=False)[1])
+            delta = self.nbytes - before
+        self._resized(delta)
+
+    def items(self):
+        """Snapshot of (key, value) pairs, most recently used last"""
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            delta, self.nbytes = -self.nbytes, 0
+        self._resized(delta)
+
+    def _resized(self, delta):
+        # Outside the lock, the callback may well take locks of its own
+        if delta and self.on_resize is not None:
+            self.on_resize(delta)
+
+
+def _nbytes(value):
+    return int(getattr(value, "nbytes", 0))
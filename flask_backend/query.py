@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+from pandas.api import types
+
+from search_index import column_text
+
+COMPARISONS = {
+    "eq": lambda s, v: s == v,
+    "ne": lambda s, v: s != v,
+    "gt": lambda s, v: s > v,
+    "gte": lambda s, v: s >= v,
+    "lt": lambda s, v: s < v,
+    "lte": lambda s, v: s <= v,
+}
+OPERATORS = set(COMPARISONS) | {"contains", "between", "in"}
+COMBINATORS = ("and", "or", "not")
+
+
+class QueryError(ValueError):
+    """A filter spec that can't be applied to the dataset"""
+
+
+def build_mask(df, spec):
+    """Evaluate a filter spec to a boolean mask over the rows of df
+
+    A spec is either a predicate
+        {"column": "price", "op": "between", "value": [10, 20]}
+    or a combination {"and": [...]}, {"or": [...]} or {"not": spec}, one
+    per object.
+    """
+    if not isinstance(spec, dict):
+        raise QueryError("Filter must be an object")
+    combinators = [key for key in COMBINATORS if key in spec]
+    if len(combinators) > 1 or (combinators and len(spec) > 1):
+        raise QueryError("Combine filters with one of 'and', 'or' or 'not' per object, "
+                         "nesting them to mix")
+    if "and" in spec or "or" in spec:
+        combine = np.logical_and if "and" in spec else np.logical_or
+        parts = spec.get("and", spec.get("or"))
+        if not isinstance(parts, list) or not parts:
+            raise QueryError("'and'/'or' need a non-empty list of filters")
+        mask = build_mask(df, parts[0])
+        for part in parts[1:]:
+            mask = combine(mask, build_mask(df, part))
+        return mask
+    if "not" in spec:
+        return ~build_mask(df, spec["not"])
+    return predicate_mask(df, spec)
+
+
+def predicate_mask(df, spec):
+    """Mask for a single column predicate"""
+    column = str(spec.get("column", "")).lower()  # process_dataframe lowercases columns
+    op = spec.get("op", "eq")
+    value = spec.get("value")
+    if column not in df.columns:
+        raise QueryError(f"Unknown column: {column}")
+    if op not in OPERATORS:
+        raise QueryError(f"Unknown operator: {op}")
+
+    series = df[column]
+    if op == "contains":
+        # Same case-insensitive substring test as /search, on one column
+        text = column_text(series)
+        return text.str.contains(str(value).lower(), regex=False).to_numpy()
+
+    if isinstance(series.dtype, pd.CategoricalDtype) and op not in ("eq", "ne", "in"):
+        series = series.astype(series.cat.categories.dtype)
+
+    if op == "in":
+        if not isinstance(value, list):
+            raise QueryError("'in' needs a list of values")
+        return series.isin([coerce(series, v) for v in value]).to_numpy()
+
+    if op == "between":
+        if not isinstance(value, list) or len(value) != 2:
+            raise QueryError("'between' needs [low, high], either may be null")
+        low, high = (coerce(series, v) for v in value)
+        mask = np.ones(len(series), dtype=bool)
+        if low is not None:
+            mask &= compare(series, "gte", low)
+        if high is not None:
+            mask &= compare(series, "lte", high)
+        return mask
+
+    if value is None and op in ("eq", "ne"):
+        missing = series.isna().to_numpy()
+        return missing if op == "eq" else ~missing
+    return compare(series, op, coerce(series, value))
+
+
+def compare(series, op, value):
+    try:
+        return np.asarray(COMPARISONS[op](series, value), dtype=bool)
+    except (TypeError, ValueError):
+        raise QueryError(f"Can't compare column {series.name} with {value!r}")
+
+
+def coerce(series, value):
+    """Convert a JSON value to the column's type so comparisons stay vectorized"""
+    if value is None:
+        return None
+    if isinstance(value, (list, dict)):
+        raise QueryError(f"Value {value!r} must be a single value, not a list or object")
+    try:
+        if types.is_bool_dtype(series.dtype):
+            return bool(value)
+        if types.is_numeric_dtype(series.dtype):
+            return pd.to_numeric(value)
+        if types.is_datetime64_any_dtype(series.dtype):
+            return pd.Timestamp(value)
+    except (ValueError, TypeError):
+        raise QueryError(f"Value {value!r} doesn't match the type of column {series.name}")
+    return value
@@ -0,0 +1,122 @@
+import itertools
+import sys
+
+import numpy as np
+import pandas as pd
+
+GRAM_SIZE = 3
+SEPARATOR = "\x00"  # Joins cells in the row text, so a match can't span two cells
+
+
+def column_text(series):
+    """Lowercased str() of every cell, as the per-record search compares them"""
+    return series.astype(object).map(str).str.lower()
+
+
+def search_positions(df, query):
+    """Row positions where any cell contains query, scanning every column"""
+    mask = np.zeros(len(df), dtype=bool)
+    for col in df.columns:
+        mask |= column_text(df[col]).str.contains(query, regex=False).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def query_grams(text):
+    return {text[i:i + GRAM_SIZE] for i in range(len(text) - GRAM_SIZE + 1)}
+
+
+class SearchIndex:
+    """Lowercased row text plus a trigram inverted index over a dataset
+
+    Postings are stored CSR style: rows[offsets[g]:offsets[g + 1]] are the
+    sorted positions of the rows whose cells contain trigram id g.
+    """
+
+    def __init__(self, df):
+        self.size = len(df)
+        self.gram_ids = {}
+        cell_text = []
+        keys = []
+        for col in df.columns:
+            # Grams are computed once per distinct value, then spread to rows
+            codes, uniques = pd.factorize(df[col].astype(object).map(str))
+            lowered = [value.lower() for value in uniques]
+            cell_text.append(np.asarray(lowered, dtype=object)[codes])
+            keys.append(self._column_keys(codes, lowered))
+
+        self.texts = [SEPARATOR.join(cells) for cells in zip(*cell_text)]
+        keys = np.concatenate(keys)
+        keys.sort()
+        # The same gram can occur in several cells of one row
+        keys = keys[np.concatenate(([True], keys[1:] != keys[:-1]))]
+        self.rows = (keys % self.size).astype(np.int32)
+        self.offsets = np.searchsorted(keys // self.size,
+                                       np.arange(len(self.gram_ids) + 1))
+
+    def _column_keys(self, codes, values):
+        """gram_id * size + row for every trigram of every cell in a column"""
+        grams_per_value = [
+            {self.gram_ids.setdefault(gram, len(self.gram_ids)) for gram in query_grams(value)}
+            for value in values
+        ]
+        counts = np.array([len(grams) for grams in grams_per_value], dtype=np.int64)
+        flat = np.fromiter(itertools.chain.from_iterable(grams_per_value),
+                           dtype=np.int64, count=int(counts.sum()))
+        value_start = np.cumsum(counts) - counts
+
+        row_counts = counts[codes]
+        row_start = np.cumsum(row_counts) - row_counts
+        total = int(row_counts.sum())
+        base = np.repeat(value_start[codes] - row_start, row_counts)
+        grams = flat[base + np.arange(total)]
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), row_counts)
+        return grams * self.size + rows
+
+    @property
+    def nbytes(self):
+        text_bytes = sum(sys.getsizeof(text) for text in self.texts)
+        gram_bytes = sum(sys.getsizeof(gram) for gram in self.gram_ids) * 2
+        return self.rows.nbytes + self.offsets.nbytes + text_bytes + gram_bytes
+
+    def candidates(self, query):
+        """Rows holding every trigram of query, or None when it is too short to filter"""
+        if len(query) < GRAM_SIZE:
+            return None
+        postings = []
+        for gram in query_grams(query):
+            gram_id = self.gram_ids.get(gram)
+            if gram_id is None:
+                return np.empty(0, dtype=np.int32)
+            postings.append(self.rows[self.offsets[gram_id]:self.offsets[gram_id + 1]])
+        postings.sort(key=len)
+        found = postings[0]
+        for rows in postings[1:]:
+            found = np.intersect1d(found, rows, assume_unique=True)
+            if not len(found):
+                break
+        return found
+
+    def search(self, query, within=None):
+        """Positions of rows with a cell containing the lowercased query, in row order
+
+        within narrows the rows checked, e.g. to the matches of a shorter
+        query that query contains.
+        """
+        texts = self.texts
+        candidates = within if within is not None else self.candidates(query)
+        if candidates is None:
+            candidates = range(self.size)
+        return np.array([i for i in candidates if query in texts[i]], dtype=np.int64)
+
+
+def narrowest_cached(cache, query):
+    """Matches cached for the longest earlier query contained in query, or None
+
+    Any row matching query also matches every substring of it, so those
+    matches are a superset to refine instead of searching every row.
+    """
+    best_query, best = None, None
+    for cached_query, positions in cache.items():
+        if cached_query in query and (best_query is None or len(cached_query) > len(best_query)):
+            best_query, best = cached_query, positions
+    return best
@@ -0,0 +1,52 @@
+import json
+import os
+import re
+import time
+import uuid
+
+VALID_KEY = re.compile(r"^[A-Za-z0-9_-]+$")
+
+
+class StatusFiles:
+    """Small JSON documents on disk, so every server process can read them
+
+    Used for progress that one process owns but any process may be asked
+    about, like a queued job or a chunked ingest.
+    """
+
+    def __init__(self, folder, retention=24 * 60 * 60):
+        self.folder = folder
+        self.retention = retention
+        os.makedirs(folder, exist_ok=True)
+        self.prune()
+
+    def write(self, key, value):
+        path = self._path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(value, f, default=str)
+        os.replace(tmp_path, path)
+
+    def read(self, key):
+        """The last document written under key, or None"""
+        if not VALID_KEY.match(key):
+            return None
+        try:
+            with open(self._path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def prune(self):
+        """Remove documents older than retention seconds"""
+        cutoff = time.time() - self.retention
+        for name in os.listdir(self.folder):
+            path = os.path.join(self.folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass  # Removed by another process meanwhile
+
+    def _path(self, key):
+        return os.path.join(self.folder, f"{key}.json")
@@ -0,0 +1,114 @@
+"""Chart summaries from aggregate(): groupby, histogram and timeseries specs"""
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregate import AggregateError, aggregate
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "region": ["north", "south", "north", "east", "south", "north"],
+        "product": ["a", "a", "b", "b", "a", "a"],
+        "sales": [10.0, 20.0, 30.0, np.nan, 5.0, 15.0],
+        "units": [1, 2, 3, 4, 5, 6],
+        "when": ["2021-01-01 10:00", "2021-01-01 23:00", "2021-01-03", "not a date",
+                 "2021-02-10", "2021-01-02"],
+    })
+
+
+def test_groupby(df):
+    result = aggregate(df, {"by": "region", "metrics": [{"column": "sales", "agg": "sum"},
+                                                       {"column": "units", "agg": "max"},
+                                                       {"agg": "count"}]})
+    assert result == {
+        "groups": [
+            {"region": "east", "count": 1, "sales_sum": 0.0, "units_max": 4},
+            {"region": "north", "count": 3, "sales_sum": 55.0, "units_max": 6},
+            {"region": "south", "count": 2, "sales_sum": 25.0, "units_max": 5},
+        ],
+        "total_groups": 3,
+    }
+
+
+def test_groupby_several_keys_sorted_and_limited(df):
+    result = aggregate(df, {"by": ["Region", "product"], "sort": "count", "limit": 2,
+                            "metrics": [{"column": "sales", "agg": "mean"}]})
+    assert result["groups"] == [
+        {"region": "north", "product": "a", "count": 2, "sales_mean": 12.5},
+        {"region": "south", "product": "a", "count": 2, "sales_mean": 12.5},
+    ]
+    assert result["total_groups"] == 2
+
+
+def test_histogram(df):
+    result = aggregate(df, {"type": "histogram", "column": "sales", "bins": 5})
+    assert result["edges"] == [5.0, 10.0, 15.0, 20.0, 25.0, 30.0]
+    assert result["counts"] == [1, 1, 1, 1, 1]
+    assert result["missing"] == 1
+
+
+def test_histogram_range_and_default_bins(df):
+    result = aggregate(df, {"type": "histogram", "column": "units", "range": [0, 10],
+                            "bins": None})
+    assert len(result["counts"]) == 20
+    assert sum(result["counts"]) == 6
+    assert result["edges"][0] == 0 and result["edges"][-1] == 10
+
+
+def test_timeseries(df):
+    result = aggregate(df, {"type": "timeseries", "column": "when", "every": "month",
+                            "metrics": [{"column": "units", "agg": "sum"}]})
+    assert result == {
+        "buckets": [
+            {"bucket": "2021-01-01T00:00:00", "count": 4, "units_sum": 12},
+            {"bucket": "2021-02-01T00:00:00", "count": 1, "units_sum": 5},
+        ],
+        "unparsed": 1,
+    }
+
+
+def test_timeseries_by_day(df):
+    result = aggregate(df, {"type": "timeseries", "column": "when", "every": "day"})
+    assert [(b["bucket"][:10], b["count"]) for b in result["buckets"]] == [
+        ("2021-01-01", 2), ("2021-01-02", 1), ("2021-01-03", 1), ("2021-02-10", 1)]
+
+
+@pytest.mark.parametrize("spec", [
+    {"type": "pie"},
+    {"by": None},
+    {"by": "missing"},
+    {"by": "region", "metrics": "sales"},
+    {"by": "region", "metrics": [1]},
+    {"by": "region", "metrics": {"column": "sales", "agg": "sum"}},
+    {"by": "region", "metrics": [{"column": "sales", "agg": "median"}]},
+    {"by": "region", "metrics": [{"column": "sales", "agg": ["sum"]}]},
+    {"by": "region", "metrics": [{"column": "region", "agg": "sum"}]},
+    {"by": "region", "sort": "sales"},
+    {"by": "region", "sort": ["count"]},
+    {"by": "region", "limit": -1},
+    {"by": "region", "limit": 1.5},
+    {"type": "histogram", "column": "region"},
+    {"type": "histogram", "column": "sales", "bins": 0},
+    {"type": "histogram", "column": "sales", "bins": True},
+    {"type": "histogram", "column": "sales", "range": [5, 5]},
+    {"type": "histogram", "column": "sales", "range": [0, "x"]},
+    {"type": "timeseries", "column": "when", "every": "fortnight"},
+    {"type": "timeseries", "column": "when", "every": ["day"]},
+])
+def test_invalid_specs(df, spec):
+    with pytest.raises(AggregateError):
+        aggregate(df, spec)
+
+
+def test_invalid_specs_are_client_errors(app_module, client, df):
+    file_id = str(uuid.uuid4())
+    app_module.data_storage.put(file_id, df)
+    for metrics in ("units", [1]):
+        response = client.post("/aggregate", json={"file_id": file_id, "by": "region",
+                                                   "metrics": metrics})
+        assert response.status_code == 400
+        assert "metrics must be" in response.get_json()["error"]
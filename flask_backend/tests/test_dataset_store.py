@@ -0,0 +1,178 @@
+"""DatasetStore: spilling over budget, reloading, and datasets shared between processes"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_store import DatasetStore, frame_nbytes, sort_positions
+
+
+def frame(rows, start=0):
+    return pd.DataFrame({"id": range(start, start + rows), "name": [f"row {i}" for i in range(rows)]})
+
+
+def test_budget_spills_least_recently_used_and_reloads_transparently(tmp_path):
+    size = frame_nbytes(frame(1000))
+    store = DatasetStore(spill_dir=str(tmp_path), memory_budget=size * 2 + size // 2)
+    for file_id in "abc":
+        store.put(file_id, frame(1000))
+    assert store.stats()["resident_datasets"] == 2 and store.stats()["spills"] == 1
+    assert os.path.exists(tmp_path / "a.feather")
+
+    pd.testing.assert_frame_equal(store.get("a"), frame(1000))
+    stats = store.stats()
+    assert (stats["misses"], stats["reloads"], stats["evictions"]) == (1, 1, 2)
+    assert os.path.exists(tmp_path / "b.feather")  # Least recently used once a came back
+    assert store.memory_usage() <= store.memory_budget
+    assert len(store) == 3 and all(file_id in store for file_id in "abc")
+
+
+def test_idle_datasets_expire_to_disk(tmp_path):
+    store = DatasetStore(spill_dir=str(tmp_path), ttl=0.05)
+    store.put("idle", frame(10))
+    time.sleep(0.1)
+    store.put("busy", frame(10))
+    assert store.stats()["expirations"] == 1 and store.memory_usage("idle") == 0
+    assert store.get("idle")["id"].tolist() == list(range(10))
+
+
+def test_frames_arrow_cant_write_stay_resident(tmp_path):
+    store = DatasetStore(spill_dir=str(tmp_path), memory_budget=1)
+    store.put("mixed", pd.DataFrame({"value": [1, "two", 3.0]}))
+    store.put("plain", frame(10))
+    assert store.stats()["spill_errors"] == 1
+    assert store.get("mixed")["value"].tolist() == [1, "two", 3.0]
+
+
+def test_derived_values_count_against_the_budget(tmp_path):
+    store = DatasetStore(spill_dir=str(tmp_path), memory_budget=frame_nbytes(frame(100)) * 3)
+    store.put("a", frame(100))
+    before = store.memory_usage("a")
+    store.derived("a", "positions", lambda df: np.arange(len(df), dtype=np.int64))
+    assert store.memory_usage("a") == before + 800
+    store.update("a", "name", [0], ["changed"])  # Derived values are rebuilt after changes
+    assert store.memory_usage("a") == frame_nbytes(store.get("a"))
+
+
+def test_replacing_a_shared_dataset_never_removes_its_files(tmp_path, monkeypatch):
+    writer = DatasetStore(spill_dir=str(tmp_path), shared=True)
+    reader = DatasetStore(spill_dir=str(tmp_path), shared=True)
+    writer.put("a", frame(3))
+    writer.describe("a", preview=[])
+
+    removed = []
+    real_remove = os.remove
+    monkeypatch.setattr(os, "remove", lambda path: removed.append(path) or real_remove(path))
+    writer.put("a", frame(5, start=10))
+    assert not [path for path in removed if not path.endswith(".tmp")]
+
+    assert "a" in reader and reader.metadata("a") is not None
+    assert reader.get("a")["id"].tolist() == [10, 11, 12, 13, 14]
+
+
+def test_replacing_with_an_unwritable_frame_removes_the_stale_files(tmp_path):
+    writer = DatasetStore(spill_dir=str(tmp_path), shared=True)
+    reader = DatasetStore(spill_dir=str(tmp_path), shared=True)
+    writer.put("a", frame(3))
+    writer.describe("a")
+
+    writer.put("a", pd.DataFrame({"mixed": [1, "two", 3.0]}))  # Arrow can't write it
+    assert writer.get("a")["mixed"].tolist() == [1, "two", 3.0]
+    assert "a" not in reader and reader.get("a") is None
+
+
+def catalogued(tmp_path, ids, **options):
+    store = DatasetStore(spill_dir=str(tmp_path), persistent=True, **options)
+    for age, file_id in enumerate(reversed(ids)):
+        store.put(file_id, frame(100))
+        store.describe(file_id)
+        # Older datasets were last used longer ago
+        used = time.time() - 3600 * (age + 1)
+        os.utime(tmp_path / f"{file_id}.json", (used, used))
+    return store
+
+
+def test_sweep_deletes_datasets_past_retention(tmp_path):
+    store = catalogued(tmp_path, ["old", "recent"], retention=3600 * 1.5)
+    assert store.sweep() == ["old"]
+    assert "old" not in store and store.get("old") is None
+    assert store.get("recent") is not None
+    assert sorted(os.listdir(tmp_path)) == ["recent.feather", "recent.json"]
+    assert store.stats()["deletions"] == 1
+
+
+def test_sweep_deletes_least_recently_used_beyond_disk_budget(tmp_path):
+    store = catalogued(tmp_path, ["a", "b", "c"])
+    size = sum(os.path.getsize(tmp_path / name) for name in os.listdir(tmp_path)) // 3
+    store.disk_budget = size * 2 + size // 2
+    assert store.sweep(keep="a") == ["b"]
+    store.disk_budget = size // 2
+    assert store.sweep(keep="a") == ["c"]
+    assert [record["file_id"] for record in store.catalog()] == ["a"]
+
+
+def test_reading_a_dataset_marks_it_used(tmp_path):
+    catalogued(tmp_path, ["a", "b"])
+    restarted = DatasetStore(spill_dir=str(tmp_path), persistent=True, retention=60)
+    restarted.get("a")
+    assert restarted.sweep() == ["b"]
+
+
+def test_sweep_deletes_old_orphaned_files(tmp_path):
+    store = DatasetStore(spill_dir=str(tmp_path), persistent=True)
+    store.put("ingesting", frame(10))  # Not described until the ingest finishes
+    (tmp_path / "crashed.feather.0a1b.tmp").write_bytes(b"partial")
+    (tmp_path / "fresh.feather.2c3d.tmp").write_bytes(b"being written")
+    old = time.time() - 7200
+    for name in ("ingesting.feather", "crashed.feather.0a1b.tmp"):
+        os.utime(tmp_path / name, (old, old))
+
+    store.sweep()
+    assert sorted(os.listdir(tmp_path)) == ["fresh.feather.2c3d.tmp", "ingesting.feather"]
+    # After a restart nothing is ingesting it any more
+    DatasetStore(spill_dir=str(tmp_path), persistent=True).sweep()
+    assert os.listdir(tmp_path) == ["fresh.feather.2c3d.tmp"]
+
+
+@pytest.mark.parametrize("values", [
+    [3, 1, None, 2, 1, None, 0],
+    [2.5, -1.0, np.nan, 2.5, 0.0],
+    ["pear", "Apple", None, "apple", "banana", "pear"],
+    pd.to_datetime(["2021-03-01", None, "2020-01-01", "2021-03-01"]),
+])
+@pytest.mark.parametrize("descending", [False, True])
+def test_sort_matches_a_stable_sort_with_missing_last(values, descending):
+    df = pd.DataFrame({"v": values})
+    expected = df.sort_values("v", ascending=not descending, kind="stable",
+                              na_position="last").index.tolist()
+    assert sort_positions(df, "v", descending).tolist() == expected
+
+
+def test_ties_keep_row_order_in_both_directions():
+    df = pd.DataFrame({"v": [1, 2, 1, 2, 1]})
+    assert sort_positions(df, "v").tolist() == [0, 2, 4, 1, 3]
+    assert sort_positions(df, "v", descending=True).tolist() == [1, 3, 0, 2, 4]
+
+
+def test_unordered_categoricals_sort_by_value_not_code(tmp_path):
+    store = DatasetStore(spill_dir=str(tmp_path))
+    store.put("a", pd.DataFrame({"v": pd.Categorical(["m", "c", None, "m"])}))
+    # New values become categories after the existing ones, out of value order
+    store.update("a", "v", [1, 2], ["z", "a"])
+    df = store.get("a")
+    assert list(df["v"].cat.categories) == ["c", "m", "a", "z"]
+    assert sort_positions(df, "v").tolist() == [2, 0, 3, 1]
+    assert sort_positions(df, "v", descending=True).tolist() == [1, 0, 3, 2]
+
+
+def test_ordered_categoricals_sort_by_their_order():
+    df = pd.DataFrame({"v": pd.Categorical(["low", "high", "mid", None], ordered=True,
+                                           categories=["low", "mid", "high"])})
+    assert sort_positions(df, "v").tolist() == [0, 2, 1, 3]
+
+
+def test_mixed_types_sort_as_text():
+    df = pd.DataFrame({"v": [10, "9", None, 2.5, "b"]})
+    assert sort_positions(df, "v").tolist() == [0, 3, 1, 4, 2]
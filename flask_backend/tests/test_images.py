@@ -0,0 +1,67 @@
+"""Image uploads: names on disk and the requests refused before anything is written"""
+import io
+import os
+import uuid
+
+import pytest
+
+PNG = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                    "1f15c4890000000d49444154789c6360f8cf00000301010018dd8db0000000"
+                    "0049454e44ae426082")
+
+
+def stored_images(app_module):
+    return set(os.listdir(app_module.IMAGE_FOLDER))
+
+
+@pytest.mark.parametrize("file_id", ["../../escape", "a/b", "", "{%s}" % uuid.uuid4(),
+                                     str(uuid.uuid4()).upper()])
+def test_file_id_must_be_a_dataset_id(app_module, client, file_id):
+    before = stored_images(app_module)
+    single = client.post("/upload_image", data={
+        "file_id": file_id, "image": (io.BytesIO(PNG), "pic.png")})
+    batch = client.post("/upload_images", data={
+        "file_id": file_id, "images": [(io.BytesIO(PNG), "pic.png")]})
+    assert single.status_code == 400 and batch.status_code == 400
+    assert stored_images(app_module) == before
+
+
+def test_upload_names_images_by_dataset_and_content(app_module, client):
+    file_id = str(uuid.uuid4())
+    response = client.post("/upload_image", data={
+        "file_id": file_id, "image": (io.BytesIO(PNG), "../pic.png")})
+    assert response.status_code == 200
+    filename = response.get_json()["image_url"].rsplit("/", 1)[1]
+    assert filename.startswith(f"{file_id}__") and filename.endswith("__pic.png")
+    assert filename in stored_images(app_module)
+
+
+def test_unresizable_image_is_served_as_is(app_module, client):
+    response = client.post("/upload_image", data={
+        "file_id": str(uuid.uuid4()), "image": (io.BytesIO(b"not an image"), "broken.png")})
+    url = response.get_json()["image_url"].replace("http://127.0.0.1:5000", "")
+    resized = client.get(f"{url}?w=50")
+    assert resized.status_code == 200
+    assert resized.data == b"not an image"
+
+
+def test_thumbnail_disk_cache_stays_within_budget(tmp_path):
+    from PIL import Image
+    from thumbnails import ThumbnailCache
+
+    source = str(tmp_path / "big.png")
+    Image.new("RGB", (300, 300), "red").save(source)
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), memory_items=1)
+    one = len(cache.get(source, (100, 100))[0])
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), memory_items=1, disk_budget=one * 3)
+
+    for width in range(90, 100):
+        cache.get(source, (width, width))
+    cached = os.listdir(tmp_path / "thumbs")
+    assert sum(os.path.getsize(tmp_path / "thumbs" / name) for name in cached) <= one * 3
+    assert 0 < len(cached) <= 4
+
+    # The latest thumbnail survives the trim and is read back from disk
+    latest = cache.get(source, (99, 99))[0]
+    cache.memory.clear()
+    assert cache.get(source, (99, 99))[0] == latest
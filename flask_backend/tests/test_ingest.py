@@ -0,0 +1,95 @@
+"""Processing uploads: compact_dtypes and chunked CSV ingest"""
+import io
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ingest import compact_dtypes, iter_csv_chunks, load_dataset, process_dataframe
+
+
+def assert_same_values(actual, expected):
+    assert list(actual.columns) == list(expected.columns)
+    for col in expected.columns:
+        left, right = actual[col].astype(object).tolist(), expected[col].astype(object).tolist()
+        assert all(a == b or (pd.isna(a) and pd.isna(b)) for a, b in zip(left, right)), col
+        assert len(left) == len(right)
+
+
+# 1e300 overflows float32 in the round trip check that keeps it float64
+@pytest.mark.filterwarnings("ignore:overflow encountered in cast:RuntimeWarning")
+def test_compact_dtypes_keeps_every_value():
+    rows = 40
+    original = pd.DataFrame({
+        "small": np.arange(rows, dtype=np.int64),
+        "negative": -np.arange(rows, dtype=np.int64) * 100,
+        "huge": np.arange(rows, dtype=np.int64) + 2 ** 40,
+        "halves": np.arange(rows) / 2,
+        "tenths": np.arange(rows) / 10,  # Not exact in float32
+        "gaps": [np.nan if i % 3 else i * 0.25 for i in range(rows)],
+        "big_float": [1e300] * rows,
+        "labels": [["red", "green", None][i % 3] for i in range(rows)],
+        "unique": [f"row {i}" for i in range(rows)],
+        "flags": [i % 2 == 0 for i in range(rows)],
+        "when": pd.date_range("2020-01-01", periods=rows, freq="h"),
+    })
+    compact, report = compact_dtypes(original.copy())
+
+    assert_same_values(compact, original)
+    assert compact["small"].dtype == np.int8 and compact["negative"].dtype == np.int16
+    assert compact["huge"].dtype == np.int64
+    assert compact["halves"].dtype == np.float32 and compact["gaps"].dtype == np.float32
+    assert compact["tenths"].dtype == np.float64 and compact["big_float"].dtype == np.float64
+    assert isinstance(compact["labels"].dtype, pd.CategoricalDtype)
+    assert not isinstance(compact["unique"].dtype, pd.CategoricalDtype)
+    assert compact["flags"].dtype == bool
+    assert report["bytes_saved"] == report["bytes_before"] - report["bytes_after"] > 0
+    assert set(report["columns"]) == {"small", "negative", "halves", "gaps", "labels"}
+
+
+def test_compact_dtypes_of_an_empty_frame():
+    compact, report = compact_dtypes(pd.DataFrame({"a": pd.Series([], dtype=object)}))
+    assert compact.empty and report["columns"] == {}
+
+
+def test_chunks_process_like_the_whole_file(tmp_path):
+    path = tmp_path / "items.csv"
+    pd.DataFrame({"Name": [f"item {i}" for i in range(23)], "Qty": range(23)}).to_csv(
+        path, index=False)
+    chunks = list(iter_csv_chunks(str(path), 5))
+    assert [offset for offset, _ in chunks] == [0, 5, 10, 15, 20]
+    whole = process_dataframe(pd.read_csv(path))
+    streamed = pd.concat([chunk for _, chunk in chunks], ignore_index=True)
+    assert_same_values(streamed, whole)
+
+
+@pytest.fixture
+def small_chunks(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, "CSV_CHUNK_ROWS", 7)
+
+
+def test_streamed_upload_is_queryable_early_and_complete_at_the_end(client, small_chunks,
+                                                                  tmp_path):
+    path = tmp_path / "stream.csv"
+    pd.DataFrame({"Name": [f"{uuid.uuid4()}" for _ in range(50)], "Qty": range(50)}).to_csv(
+        path, index=False)
+    with open(path, "rb") as f:
+        client.post("/upload", data={"file": (io.BytesIO(f.read()), "stream.csv")})
+
+    started = client.post("/process", json={"filename": "stream.csv", "stream": True}).get_json()
+    assert started["complete"] is False and started["rows"] == 7
+    assert len(started["preview"]) == 5
+    file_id = started["file_id"]
+
+    deadline = time.time() + 20
+    status = client.get(f"/process_status/{file_id}").get_json()
+    while not status["done"] and time.time() < deadline:
+        time.sleep(0.02)
+        status = client.get(f"/process_status/{file_id}").get_json()
+    assert status["done"] and status["error"] is None and status["rows"] == 50
+
+    rows = client.get(f"/get_data/{file_id}", query_string={"limit": 100}).get_json()["data"]
+    expected, _, _ = load_dataset(str(path))
+    assert_same_values(pd.DataFrame(rows)[list(expected.columns)], expected)
@@ -0,0 +1,58 @@
+"""/process reuses the dataset of content processed before, while it is unchanged"""
+import io
+import json
+import uuid
+
+import openpyxl
+
+from test_images import PNG
+
+
+def upload(client, name, content):
+    response = client.post("/upload", data={"file": (io.BytesIO(content), name)})
+    assert response.status_code == 200
+    return response.get_json()["filename"]
+
+
+def process(client, **body):
+    response = client.post("/process", json=dict(body, wait=20))
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_same_content_is_processed_once(client):
+    content = f"name,qty\n{uuid.uuid4()},1\nb,2\n".encode()
+    first = process(client, filename=upload(client, "first.csv", content))
+    again = process(client, filename=upload(client, "again.csv", content))
+    assert not first.get("cached") and again["cached"]
+    assert again["file_id"] == first["file_id"]
+
+
+def test_default_and_named_first_sheet_share_a_dataset(client, tmp_path):
+    workbook = openpyxl.Workbook()
+    workbook.active.title = "Orders"
+    workbook.active.append(["order", str(uuid.uuid4())])
+    workbook.active.append([1, 2])
+    workbook.create_sheet("Other").append(["x"])
+    path = tmp_path / "book.xlsx"
+    workbook.save(path)
+    filename = upload(client, "book.xlsx", path.read_bytes())
+
+    default = process(client, filename=filename)
+    named = process(client, filename=filename, sheet="Orders")
+    assert named["cached"] and named["file_id"] == default["file_id"]
+    assert default["sheet"] == "Orders"
+
+
+def test_datasets_changed_by_image_binding_are_not_reused(client):
+    content = f"name,image_url\n{uuid.uuid4()},\nb,\n".encode()
+    first = process(client, filename=upload(client, "bound.csv", content))
+    response = client.post("/upload_images", data={
+        "file_id": first["file_id"], "manifest": json.dumps({"pic.png": 0}),
+        "images": [(io.BytesIO(PNG), "pic.png")]})
+    assert response.get_json()["rows_updated"] == 1
+
+    again = process(client, filename=upload(client, "bound_again.csv", content))
+    assert not again.get("cached") and again["file_id"] != first["file_id"]
+    assert "pic.png" in str(client.get(f"/get_data/{first['file_id']}").get_json())
+    assert "pic.png" not in str(client.get(f"/get_data/{again['file_id']}").get_json())
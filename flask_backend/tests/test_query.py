@@ -0,0 +1,120 @@
+"""Filter specs for /query: build_mask, coerce and the request checks around them"""
+import uuid
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from query import QueryError, build_mask, coerce
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "name": ["apple", "Banana", "cherry", None],
+        "price": [1.5, 3.0, 7.25, np.nan],
+        "qty": pd.array([1, 5, 10, 0], dtype="int64"),
+        "when": pd.to_datetime(["2020-01-01", "2020-06-01", "2021-01-01", None]),
+        "kind": pd.Categorical(["fruit", "fruit", "berry", "fruit"]),
+    })
+
+
+def rows(df, spec):
+    return np.flatnonzero(build_mask(df, spec)).tolist()
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ({"column": "qty", "value": 5}, [1]),
+    ({"column": "qty", "op": "ne", "value": 5}, [0, 2, 3]),
+    ({"column": "price", "op": "gt", "value": "2"}, [1, 2]),
+    ({"column": "price", "op": "lte", "value": 3}, [0, 1]),
+    ({"column": "price", "op": "between", "value": [2, None]}, [1, 2]),
+    ({"column": "when", "op": "lt", "value": "2020-12-31"}, [0, 1]),
+    ({"column": "name", "op": "contains", "value": "BAN"}, [1]),
+    ({"column": "name", "value": None}, [3]),
+    ({"column": "kind", "op": "in", "value": ["berry"]}, [2]),
+    ({"column": "kind", "op": "gte", "value": "c"}, [0, 1, 3]),
+    ({"column": "Qty", "op": "lt", "value": 2}, [0, 3]),
+])
+def test_predicates(df, spec, expected):
+    assert rows(df, spec) == expected
+
+
+def test_combinators(df):
+    cheap = {"column": "price", "op": "lt", "value": 5}
+    fruit = {"column": "kind", "value": "fruit"}
+    assert rows(df, {"and": [cheap, fruit]}) == [0, 1]
+    assert rows(df, {"or": [cheap, {"column": "qty", "value": 10}]}) == [0, 1, 2]
+    assert rows(df, {"not": fruit}) == [2]
+    assert rows(df, {"and": [{"or": [cheap]}, {"not": {"column": "qty", "value": 1}}]}) == [1]
+
+
+@pytest.mark.parametrize("spec", [
+    {"and": [{"column": "qty", "value": 1}], "or": [{"column": "qty", "value": 5}]},
+    {"and": [{"column": "qty", "value": 1}], "column": "qty", "value": 5},
+    {"not": {"column": "qty", "value": 1}, "column": "qty", "value": 5},
+])
+def test_mixed_combinators_are_rejected(df, spec):
+    with pytest.raises(QueryError, match="one of"):
+        build_mask(df, spec)
+
+
+@pytest.mark.parametrize("spec", [
+    {"column": "qty", "value": [1, 5]},
+    {"column": "price", "op": "gt", "value": {"min": 1}},
+    {"column": "qty", "op": "in", "value": [1, [5]]},
+    {"column": "qty", "op": "between", "value": [[1], 5]},
+])
+def test_list_values_are_rejected(df, spec):
+    with pytest.raises(QueryError, match="single value"):
+        build_mask(df, spec)
+
+
+@pytest.mark.parametrize("spec", [
+    [],
+    {"and": []},
+    {"column": "missing", "value": 1},
+    {"column": "qty", "op": "like", "value": 1},
+    {"column": "qty", "op": "in", "value": 1},
+    {"column": "qty", "op": "between", "value": [1]},
+    {"column": "qty", "value": "many"},
+    {"column": "name", "op": "gt", "value": 1},
+])
+def test_invalid_specs(df, spec):
+    with pytest.raises(QueryError):
+        build_mask(df, spec)
+
+
+def test_coerce(df):
+    assert coerce(df["qty"], "5") == 5
+    assert coerce(df["when"], "2020-06-01") == pd.Timestamp("2020-06-01")
+    assert coerce(df["name"], 5) == 5
+    assert coerce(df["qty"], None) is None
+    with pytest.raises(QueryError):
+        coerce(df["when"], "not a date")
+
+
+@pytest.mark.parametrize("page", [
+    {"offset": None}, {"limit": []}, {"offset": {}}, {"offset": -1}, {"limit": 0}, {"limit": "x"}
+])
+def test_bad_pagination_is_a_client_error(app_module, client, df, page):
+    file_id = str(uuid.uuid4())
+    app_module.data_storage.put(file_id, df)
+    body = {"file_id": file_id, "filter": {"column": "qty", "op": "gt", "value": 0}, **page}
+    response = client.post("/query", json=body)
+    if page == {"offset": None}:
+        # null means the default, as an absent key does
+        assert response.status_code == 200
+        assert len(response.get_json()["results"]) == 3
+    else:
+        assert response.status_code == 400
+        assert "pagination" in response.get_json()["error"]
+
+
+def test_query_errors_are_client_errors(app_module, client, df):
+    file_id = str(uuid.uuid4())
+    app_module.data_storage.put(file_id, df)
+    response = client.post("/query", json={"file_id": file_id, "filter": {"column": "qty",
+                                                                          "value": [1, 2]}})
+    assert response.status_code == 400
+    assert "single value" in response.get_json()["error"]
@@ -0,0 +1,82 @@
+"""read_excel_sheet against pd.read_excel on the sheet layouts it must agree on
+
+Run from flask_backend: python -m pytest tests
+"""
+import datetime
+import os
+import sys
+
+import openpyxl
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import read_excel_sheet  # noqa: E402
+
+
+def fill(ws, cells):
+    for ref, value in cells.items():
+        ws[ref] = value
+
+
+LAYOUTS = {
+    # openpyxl writes formulas without a cached value, as an uncalculated file has
+    "formulas_without_values": {
+        "A1": "qty", "B1": "double", "A2": 1, "B2": "=A2*2", "A3": 2, "B3": "=A3*2"
+    },
+    "leading_blank_rows": {
+        "B3": "name", "C3": "qty", "B4": "a", "C4": 1, "B5": "b", "C5": 2
+    },
+    "middle_blank_rows": {
+        "A1": "name", "B1": "qty", "A2": "a", "B2": 1, "A5": "b", "B5": 2.5
+    },
+    "dates": {
+        "A1": "when", "B1": "n",
+        "A2": datetime.datetime(2020, 1, 2), "B2": 1,
+        "A3": datetime.datetime(2021, 5, 6, 7, 8, 9), "B3": 2,
+        "A4": datetime.date(1999, 12, 31), "B4": 3
+    },
+    # Below the header, read_excel's default na_values are missing; the header keeps them
+    "na_strings": {
+        "A1": "NA", "B1": "n", "A2": "NA", "B2": 1, "A3": "null", "B3": 2, "A4": "N/A", "B4": 3,
+        "A5": "nan", "B5": 4, "A6": "#N/A", "B6": 5, "A7": "", "B7": 6, "A8": "real", "B8": 7,
+        "A9": " NA", "B9": 8
+    },
+    "error_cells": {
+        "A1": "value", "B1": "ratio", "C1": "=1/0",
+        "A2": "#N/A", "B2": "#DIV/0!", "A3": "x", "B3": 0.5, "A4": "#REF!", "B4": 1
+    },
+    "booleans": {
+        "A1": "flag", "B1": "mixed", "A2": True, "B2": False, "A3": False, "B3": "text",
+        "A4": True, "B4": 0
+    }
+}
+
+
+@pytest.mark.parametrize("layout", sorted(LAYOUTS))
+def test_matches_read_excel(tmp_path, layout):
+    path = str(tmp_path / f"{layout}.xlsx")
+    workbook = openpyxl.Workbook()
+    fill(workbook.active, LAYOUTS[layout])
+    if layout == "error_cells":
+        # openpyxl only writes t="e" for error codes it is told are errors
+        for ref in ("A2", "B2", "A4"):
+            workbook.active[ref].data_type = "e"
+    workbook.save(path)
+
+    expected = pd.read_excel(path, engine="openpyxl")
+    actual = read_excel_sheet(path)
+    # Dtypes are settled later by compact_dtypes, so only values must agree
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+
+def test_later_sheet(tmp_path):
+    path = str(tmp_path / "sheets.xlsx")
+    workbook = openpyxl.Workbook()
+    fill(workbook.active, {"A1": "first"})
+    fill(workbook.create_sheet("Second"), {"A1": "x", "A2": 1, "A3": "=A2+1"})
+    workbook.save(path)
+
+    pd.testing.assert_frame_equal(read_excel_sheet(path, "Second"),
+                                  pd.read_excel(path, sheet_name="Second", engine="openpyxl"),
+                                  check_dtype=False)
@@ -0,0 +1,67 @@
+"""SearchIndex must find exactly the rows a str.contains scan of every column finds"""
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lru import LRUCache
+from search_index import SearchIndex, narrowest_cached, search_positions
+
+
+@pytest.fixture(scope="module")
+def df():
+    return pd.DataFrame({
+        "name": ["Crème brûlée", "東京の商品", "Straße", "ÉCLAIR au café", "plain", None, "ab"],
+        "price": [1.5, 20.0, np.nan, 3.25, 100.0, 7.0, 0.5],
+        "qty": [1, 22, 333, 4, 55, 6, 7],
+        "kind": pd.Categorical(["dessert", "item", "road", "dessert", "item", "item", "x"]),
+        "ok": [True, False, True, True, False, True, False],
+    })
+
+
+@pytest.mark.parametrize("query", [
+    "crème", "è", "brû", "東京", "京の商", "商", "straße", "strasse", "éclair", "café",
+    "nan", "none", "1.5", "22", "3", "true", "dessert", "item", "ab", "a", "", "plain",
+    "no such text", "e b", "0.5",
+])
+def test_search_matches_scan(df, query):
+    index = SearchIndex(df)
+    np.testing.assert_array_equal(index.search(query), search_positions(df, query))
+
+
+def test_matches_never_span_cells(df):
+    # "plain" ends one cell and "100.0" starts the next
+    assert not len(SearchIndex(df).search("plain100"))
+
+
+def test_search_matches_scan_on_random_text():
+    rng = random.Random(0)
+    alphabet = "aábcçdeé東京 1"
+    df = pd.DataFrame({
+        "a": ["".join(rng.choices(alphabet, k=rng.randrange(0, 8))) for _ in range(300)],
+        "b": ["".join(rng.choices(alphabet, k=rng.randrange(0, 4))) for _ in range(300)],
+    })
+    index = SearchIndex(df)
+    for _ in range(200):
+        query = "".join(rng.choices(alphabet, k=rng.randrange(1, 5)))
+        np.testing.assert_array_equal(index.search(query), search_positions(df, query))
+
+
+def test_refining_cached_matches_as_a_query_grows(df):
+    index = SearchIndex(df)
+    cache = LRUCache(8)
+    for query in ["c", "ca", "caf", "café", "é", "éc", "écl", "éclair"]:
+        within = narrowest_cached(cache, query)
+        positions = index.search(query, within=within)
+        np.testing.assert_array_equal(positions, search_positions(df, query))
+        cache.put(query, positions)
+
+
+def test_narrowest_cached_picks_the_longest_contained_query():
+    cache = LRUCache(8)
+    for query, positions in [("c", [0, 1, 2]), ("crè", [0]), ("me", [0, 3]), ("xyz", [])]:
+        cache.put(query, np.array(positions))
+    assert narrowest_cached(cache, "crème").tolist() == [0]
+    assert narrowest_cached(cache, "home").tolist() == [0, 3]
+    assert narrowest_cached(cache, "zzz") is None
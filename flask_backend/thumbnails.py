@@ -0,0 +1,180 @@
+import hashlib
+import io
+import os
+import threading
+import uuid
+
+from PIL import Image, ImageSequence
+
+from lru import LRUCache
+
+PRESETS = {"thumb": (100, 100), "small": (200, 200), "medium": (400, 400)}
+MAX_SIZE = 1024
+JPEG_QUALITY = 85
+FORMATS = {".png": ("PNG", "image/png"), ".gif": ("GIF", "image/gif")}
+DEFAULT_FORMAT = ("JPEG", "image/jpeg")
+DISK_BUDGET = 256 * 1024 * 1024  # Bytes of thumbnails kept on disk
+TRIM_TO = 0.9  # Fraction of the budget left after trimming, so trims are rare
+# Raised for sources Pillow can't or won't resize: unreadable, truncated or too large
+THUMBNAIL_ERRORS = (OSError, ValueError, Image.DecompressionBombError)
+
+
+def output_format(path):
+    """Pillow format name and mimetype for a thumbnail of path"""
+    return FORMATS.get(os.path.splitext(path)[1].lower(), DEFAULT_FORMAT)
+
+
+def parse_size(args):
+    """(width, height) from ?w=&h= or ?preset=, None when no resizing is asked for
+
+    Raises ValueError for unknown presets or sizes outside 1..MAX_SIZE.
+    """
+    preset = args.get("preset")
+    if preset:
+        if preset not in PRESETS:
+            raise ValueError(f"Unknown preset: {preset}")
+        return PRESETS[preset]
+    width, height = args.get("w"), args.get("h")
+    if width is None and height is None:
+        return None
+    # A single dimension bounds that side only
+    width = int(width) if width is not None else MAX_SIZE
+    height = int(height) if height is not None else MAX_SIZE
+    if not (0 < width <= MAX_SIZE and 0 < height <= MAX_SIZE):
+        raise ValueError(f"Size must be between 1 and {MAX_SIZE}")
+    return width, height
+
+
+def parse_frames(args):
+    """GIF frame limit from ?frames=: 'first' is 1, a number caps the count, None keeps all"""
+    frames = args.get("frames")
+    if frames is None:
+        return None
+    if frames == "first":
+        return 1
+    frames = int(frames)
+    if frames <= 0:
+        raise ValueError("frames must be 'first' or a positive number")
+    return frames
+
+
+class ThumbnailCache:
+    """Resized images cached on disk and in memory
+
+    Entries are keyed by the source's path, mtime and size plus the
+    requested box and frame limit, so editing a source image yields new
+    thumbnails instead of stale ones. Files on disk are kept within
+    disk_budget bytes, least recently used (by mtime, touched on each
+    read) deleted first; processes sharing the directory each trim it.
+    """
+
+    def __init__(self, cache_dir, memory_items=512, disk_budget=DISK_BUDGET):
+        self.cache_dir = cache_dir
+        self.memory = LRUCache(memory_items)
+        self.disk_budget = disk_budget
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        self._disk_bytes = self._trim()
+
+    def get(self, source, size, frames=None):
+        """Thumbnail bytes and mimetype for source fitted inside size"""
+        stat = os.stat(source)
+        fmt, mimetype = output_format(source)
+        key = f"{os.path.abspath(source)}|{stat.st_mtime_ns}|{stat.st_size}|{size}|{frames}"
+        data = self.memory.get(key)
+        if data is not None:
+            return data, mimetype
+
+        name = hashlib.sha1(key.encode()).hexdigest() + "." + fmt.lower()
+        cache_path = os.path.join(self.cache_dir, name)
+        data = self._read(cache_path)
+        if data is None:
+            data = make_thumbnail(source, size, fmt, frames)
+            self._write(cache_path, data)
+        self.memory.put(key, data)
+        return data, mimetype
+
+    def _read(self, path):
+        """Bytes of a cached file, marked as recently used; None if absent or trimmed"""
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            # Disk full, or trimmed by another process; serve it uncached
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        with self._lock:
+            self._disk_bytes += len(data)
+            if self._disk_bytes > self.disk_budget:
+                self._disk_bytes = self._trim()
+
+    def _trim(self):
+        """Delete the least recently used files over the budget, returning the bytes left"""
+        files = []
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file():
+                        stat = entry.stat()
+                        files.append((stat.st_mtime, stat.st_size, entry.path))
+                except FileNotFoundError:
+                    continue  # Trimmed by another process meanwhile
+        total = sum(size for _, size, _ in files)
+        if total <= self.disk_budget:
+            return total
+        for _, size, path in sorted(files):
+            if total <= self.disk_budget * TRIM_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        return total
+
+
+def make_thumbnail(source, size, fmt, frames=None):
+    """Encode source scaled down to fit size, keeping aspect ratio"""
+    out = io.BytesIO()
+    with Image.open(source) as img:
+        if fmt == "GIF" and getattr(img, "is_animated", False) and frames != 1:
+            save_animated(img, size, out, frames)
+            return out.getvalue()
+
+        img.thumbnail(size)
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        options = {"quality": JPEG_QUALITY, "optimize": True} if fmt == "JPEG" else {}
+        img.save(out, fmt, **options)
+    return out.getvalue()
+
+
+def save_animated(img, size, out, max_frames=None):
+    """Resize every frame of a GIF, keeping at most max_frames evenly spaced ones"""
+    total = img.n_frames
+    step = 1 if not max_frames or total <= max_frames else -(-total // max_frames)
+    resized, durations = [], []
+    for index, frame in enumerate(ImageSequence.Iterator(img)):
+        duration = frame.info.get("duration", 100)
+        if index % step:
+            # Dropped frames lend their time to the kept one before them
+            durations[-1] += duration
+            continue
+        frame = frame.convert("RGBA")
+        frame.thumbnail(size)
+        resized.append(frame)
+        durations.append(duration)
+    resized[0].save(out, "GIF", save_all=True, append_images=resized[1:],
+                    duration=durations, loop=img.info.get("loop", 0), disposal=2)
@@ -0,0 +1,40 @@
+import io
+import json
+
+import pyarrow as pa
+
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+META_KEY = b"meta"  # Schema metadata key holding the paging metadata as JSON
+
+
+def arrow_batches(df, meta=None, batch_size=500):
+    """Yield an Arrow IPC stream of df, one record batch at a time
+
+    The response's paging metadata (total, next_offset...) travels as JSON
+    in the schema metadata. Raises pyarrow's ArrowInvalid/ArrowTypeError
+    up front for columns Arrow can't represent, e.g. mixed type objects.
+    """
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    if meta is not None:
+        metadata = dict(table.schema.metadata or {})
+        metadata[META_KEY] = json.dumps(meta).encode()
+        table = table.replace_schema_metadata(metadata)
+    return _write_stream(table, batch_size)
+
+
+def _write_stream(table, batch_size):
+    sink = io.BytesIO()
+    writer = pa.ipc.new_stream(sink, table.schema)
+    for batch in table.to_batches(max_chunksize=batch_size):
+        writer.write_batch(batch)
+        yield _drain(sink)
+    writer.close()
+    yield _drain(sink)
+
+
+def _drain(sink):
+    """Bytes written to sink so far, leaving it empty"""
+    data = sink.getvalue()
+    sink.seek(0)
+    sink.truncate()
+    return data
@@ -0,0 +1,13 @@
+"""Production entry point for multi-process servers
+
+Run from flask_backend/:  gunicorn -c gunicorn.conf.py wsgi:app
+
+Each worker process keeps its own cache of datasets, so state every worker
+needs (datasets, job and ingest progress) is shared through files under
+uploads/.
+"""
+import os
+
+os.environ.setdefault("SHARED_STATE", "1")
+
+from app import app  # noqa: E402,F401
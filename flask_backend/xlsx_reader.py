@@ -0,0 +1,212 @@
+import datetime
+import posixpath
+import zipfile
+from xml.etree.ElementTree import XMLParser, fromstring, iterparse
+
+from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format
+from openpyxl.utils.cell import column_index_from_string
+
+MAIN_NAMESPACES = ("http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+                   "http://purl.oclc.org/ooxml/spreadsheetml/main")  # Transitional, strict
+PACKAGE_RELS = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+EPOCH_1900 = datetime.datetime(1899, 12, 30)  # Serial 0, accounting for Lotus' leap year bug
+EPOCH_1904 = datetime.datetime(1904, 1, 1)
+READ_SIZE = 1024 * 1024  # Bytes of sheet XML parsed between yielding rows
+DIGITS = "0123456789"
+
+
+class Workbook:
+    """Read-only access to the sheets of an .xlsx file, values only
+
+    Sheet XML is streamed through expat into rows of values directly,
+    without the element tree or per-cell objects openpyxl builds, which
+    makes large sheets several times faster to read. Values match openpyxl
+    in read-only, data_only mode: shared and inline strings, numbers (int
+    when written without a fraction), booleans, and datetimes for cells
+    with a date number format; except that error cells ("#N/A", "#DIV/0!")
+    read as None, as pandas reads them.
+    """
+
+    def __init__(self, path):
+        self._zip = zipfile.ZipFile(path)
+        root = fromstring(self._zip.read("xl/workbook.xml"))
+        self._ns = "{%s}" % next(ns for ns in MAIN_NAMESPACES if root.tag == f"{{{ns}}}workbook")
+        targets = self._relationships("xl/_rels/workbook.xml.rels")
+        self._sheets = {}  # name -> part path, in workbook order
+        for sheet in root.iter(f"{self._ns}sheet"):
+            # r:id, whose namespace differs between transitional and strict files
+            rel_id = next(value for key, value in sheet.attrib.items() if key.endswith("}id"))
+            self._sheets[sheet.get("name")] = targets[rel_id]
+        properties = root.find(f"{self._ns}workbookPr")
+        date1904 = properties is not None and properties.get("date1904") in ("1", "true")
+        self.epoch = EPOCH_1904 if date1904 else EPOCH_1900
+        self._strings = None
+        self._date_styles = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._zip.close()
+
+    @property
+    def sheet_names(self):
+        return list(self._sheets)
+
+    def rows(self, sheet=None):
+        """Yield each row of a sheet (the first by default) as a list of values
+
+        Rows missing from the file come out empty, so positions match the
+        sheet; trailing empty cells are not padded.
+        """
+        name = sheet if sheet is not None else next(iter(self._sheets), None)
+        if name not in self._sheets:
+            raise KeyError(f"Worksheet {sheet} does not exist")
+        part = self._sheets[name]
+        if not part.startswith("xl/worksheets/"):
+            return  # Chartsheets and dialog sheets hold no cells
+
+        target = _SheetTarget(self._ns, self._shared_strings(), self._date_style_ids(),
+                              self.epoch)
+        parser = XMLParser(target=target)
+        with self._zip.open(part) as f:
+            for chunk in iter(lambda: f.read(READ_SIZE), b""):
+                parser.feed(chunk)
+                yield from target.drain()
+        parser.close()
+        yield from target.drain()
+
+    def _relationships(self, part):
+        """Relationship id -> target part path"""
+        folder = posixpath.dirname(posixpath.dirname(part))
+        targets = {}
+        for rel in fromstring(self._zip.read(part)).iter(PACKAGE_RELS):
+            target = rel.get("Target")
+            if target.startswith("/"):
+                target = target[1:]
+            else:
+                target = posixpath.normpath(posixpath.join(folder, target))
+            targets[rel.get("Id")] = target
+        return targets
+
+    def _shared_strings(self):
+        if self._strings is None:
+            self._strings = []
+            if "xl/sharedStrings.xml" in self._zip.namelist():
+                item_tag, text_tag = f"{self._ns}si", f"{self._ns}t"
+                phonetic_tag = f"{self._ns}rPh"
+                with self._zip.open("xl/sharedStrings.xml") as f:
+                    for _, elem in iterparse(f):
+                        if elem.tag == item_tag:
+                            # Rich text runs are joined; phonetic hints are not part of the value
+                            for phonetic in elem.findall(phonetic_tag):
+                                elem.remove(phonetic)
+                            self._strings.append("".join(
+                                "".join(t.itertext()) for t in elem.iter(text_tag)))
+                            elem.clear()
+        return self._strings
+
+    def _date_style_ids(self):
+        """Indexes of the cell styles whose number format is a date or time"""
+        if self._date_styles is None:
+            self._date_styles = set()
+            if "xl/styles.xml" in self._zip.namelist():
+                root = fromstring(self._zip.read("xl/styles.xml"))
+                formats = dict(BUILTIN_FORMATS)
+                for fmt in root.iter(f"{self._ns}numFmt"):
+                    formats[int(fmt.get("numFmtId"))] = fmt.get("formatCode")
+                cell_xfs = root.find(f"{self._ns}cellXfs")
+                for i, xf in enumerate(cell_xfs if cell_xfs is not None else []):
+                    if is_date_format(formats.get(int(xf.get("numFmtId", 0)))):
+                        self._date_styles.add(str(i))  # Compared with the raw s attribute
+        return self._date_styles
+
+
+class _SheetTarget:
+    """XMLParser target collecting the rows of a sheet as lists of values"""
+
+    def __init__(self, ns, strings, date_styles, epoch):
+        self.cell_tag, self.row_tag = f"{ns}c", f"{ns}row"
+        self.value_tag, self.text_tag = f"{ns}v", f"{ns}t"
+        self.strings = strings
+        self.date_styles = date_styles
+        self.epoch = epoch
+        self.rows = []  # Complete rows not yet drained
+        self.row = []
+        self.next_row = 1
+        self.kind = None  # t attribute of the current cell
+        self.style = None
+        self.text = None  # Character data of the current <v>/<t>, while inside one
+        self.value = None
+
+    def start(self, tag, attrib):
+        if tag == self.cell_tag:
+            ref = attrib.get("r")
+            if ref is not None:
+                column = column_index_from_string(ref.rstrip(DIGITS)) - 1
+                if column > len(self.row):
+                    self.row.extend([None] * (column - len(self.row)))
+            self.kind = attrib.get("t", "n")
+            self.style = attrib.get("s")
+            self.value = None
+        elif tag == self.value_tag or (tag == self.text_tag and self.kind == "inlineStr"):
+            self.text = []
+        elif tag == self.row_tag:
+            index = int(attrib.get("r", self.next_row))
+            self.rows.extend([] for _ in range(index - self.next_row))
+            self.next_row = index + 1
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+    def end(self, tag):
+        if tag == self.cell_tag:
+            # An empty <v/> is a formula Excel never calculated; read_excel gives NaN
+            self.row.append(self.convert(self.kind, self.value) if self.value else None)
+            self.kind = None
+        elif self.text is not None and (tag == self.value_tag or tag == self.text_tag):
+            # Inline rich text has one <t> per run
+            self.value = (self.value or "") + "".join(self.text)
+            self.text = None
+        elif tag == self.row_tag:
+            self.rows.append(self.row)
+            self.row = []
+
+    def close(self):
+        pass
+
+    def drain(self):
+        rows, self.rows = self.rows, []
+        return rows
+
+    def convert(self, kind, text):
+        if kind == "n":
+            value = float(text) if "." in text or "E" in text or "e" in text else int(text)
+            if self.style in self.date_styles:
+                return excel_datetime(value, self.epoch)
+            return value
+        if kind == "s":
+            return self.strings[int(text)]
+        if kind == "b":
+            return text == "1"
+        if kind == "d":
+            return datetime.datetime.fromisoformat(text.rstrip("Z"))
+        if kind == "e":
+            return None
+        return text  # inlineStr and "str" formula results
+
+
+def excel_datetime(serial, epoch=EPOCH_1900):
+    """Excel serial date to datetime (or time, for fractions of a day)"""
+    day, fraction = divmod(serial, 1)
+    delta = datetime.timedelta(milliseconds=round(fraction * 86400 * 1000))
+    if 0 <= serial < 1 and delta.days == 0:
+        return (datetime.datetime.min + delta).time()
+    if 0 < serial < 60 and epoch == EPOCH_1900:
+        day += 1  # Before the phantom 29 Feb 1900
+    return epoch + datetime.timedelta(days=day) + delta
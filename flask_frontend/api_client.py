@@ -0,0 +1,293 @@
+import json
+import mimetypes
+import os
+import threading
+import uuid
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from kivy.clock import Clock
+
+try:
+    import pyarrow as pa
+except ImportError:  # Pages are then requested as JSON
+    pa = None
+
+BASE_URL = 'http://127.0.0.1:5000'
+MAX_WORKERS = 4
+UPLOAD_BLOCK_SIZE = 64 * 1024
+PROGRESS_INTERVAL = 0.1  # Seconds between progress callbacks
+
+ARROW_STREAM_MIMETYPE = 'application/vnd.apache.arrow.stream'
+# Accept header for paged row data, columnar Arrow when we can decode it
+PAGE_ACCEPT = f'{ARROW_STREAM_MIMETYPE}, application/json;q=0.9' if pa else 'application/json'
+
+
+class PageRow(Mapping):
+    """Read-only row of a decoded Arrow page, looking its values up by column
+
+    Pages are decoded a column at a time; rows index into those lists
+    instead of each becoming a dict, which costs more than the decode.
+    """
+    __slots__ = ('_columns', '_index')
+
+    def __init__(self, columns, index):
+        self._columns = columns
+        self._index = index
+
+    def __getitem__(self, key):
+        return self._columns[key][self._index]
+
+    def get(self, key, default=None):
+        column = self._columns.get(key)
+        return default if column is None else column[self._index]
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+
+def read_page(response, key):
+    """A page response as JSON shaped dict, rows under key
+
+    Arrow IPC bodies carry the paging metadata in their schema; their rows
+    are PageRow mappings over the decoded columns rather than dicts.
+    """
+    if not response.headers.get('Content-Type', '').startswith(ARROW_STREAM_MIMETYPE):
+        return response.json()
+    table = pa.ipc.open_stream(response.content).read_all()
+    page = json.loads(table.schema.metadata[b'meta'])
+    columns = {}
+    for name, column in zip(table.column_names, table.columns):
+        if pa.types.is_dictionary(column.type):
+            column = column.cast(column.type.value_type)
+        columns[name] = column.to_pylist()
+    page[key] = [PageRow(columns, i) for i in range(table.num_rows)]
+    return page
+
+
+def decode_json(response):
+    """(status code, JSON body) of a response, for parse= on the worker thread
+
+    Error responses that aren't JSON, such as a proxy's HTML 502, become
+    {"error": text}; a success body that doesn't decode raises, so it
+    reaches on_error instead of a callback on the main thread.
+    """
+    try:
+        return response.status_code, response.json()
+    except ValueError:
+        if response.ok:
+            raise
+        return response.status_code, {'error': f'HTTP {response.status_code}: {response.text[:200]}'}
+
+
+def decode_page(key):
+    """parse= for paged endpoints: (status code, read_page body or JSON error)"""
+    def parse(response):
+        if response.status_code == 200:
+            return response.status_code, read_page(response, key)
+        return decode_json(response)
+    return parse
+
+
+class ApiRequest:
+    """Handle for a request running in the background"""
+
+    def __init__(self, channel=None, cleanup=None):
+        self.channel = channel
+        self.cleanup = cleanup
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        """Drop the result; a request not started yet is never sent"""
+        self.cancelled = True
+        if self.future is not None and self.future.cancel() and self.cleanup:
+            self.cleanup()  # Its worker never runs to do it
+
+
+class MultipartBody:
+    """multipart/form-data body read in blocks, so uploads can report progress
+
+    requests sends file-like bodies block by block with a Content-Length
+    taken from len(), instead of encoding the whole form in memory.
+    """
+
+    def __init__(self, fields=None, files=None, on_read=None):
+        self.boundary = uuid.uuid4().hex
+        self.on_read = on_read
+        self.sent = 0
+        self._parts = []  # bytes, file paths or open files, in order
+        self._length = 0
+        for name, value in (fields or {}).items():
+            self._add(self._header(name) + b'\r\n' + str(value).encode() + b'\r\n')
+        for name, path in files or []:
+            filename = os.path.basename(path)
+            content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            self._add(self._header(name, filename) +
+                      f'Content-Type: {content_type}\r\n\r\n'.encode())
+            self._parts.append(path)  # Opened once the body is sent
+            self._length += os.path.getsize(path)
+            self._add(b'\r\n')
+        self._add(f'--{self.boundary}--\r\n'.encode())
+
+    @property
+    def content_type(self):
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self):
+        return self._length
+
+    def _header(self, name, filename=None):
+        disposition = f'form-data; name="{name}"'
+        if filename is not None:
+            disposition += f'; filename="{filename}"'
+        return f'--{self.boundary}\r\nContent-Disposition: {disposition}\r\n'.encode()
+
+    def _add(self, data):
+        self._parts.append(data)
+        self._length += len(data)
+
+    def read(self, size=UPLOAD_BLOCK_SIZE):
+        while self._parts:
+            part = self._parts[0]
+            if isinstance(part, str):
+                self._parts[0] = open(part, 'rb')
+                continue
+            if isinstance(part, bytes):
+                data, rest = part[:size], part[size:]
+                if rest:
+                    self._parts[0] = rest
+                else:
+                    self._parts.pop(0)
+            else:
+                data = part.read(size)
+                if not data:
+                    part.close()
+                    self._parts.pop(0)
+                    continue
+            self.sent += len(data)
+            if self.on_read:
+                self.on_read(self.sent, self._length)
+            return data
+        return b''
+
+    def close(self):
+        for part in self._parts:
+            if not isinstance(part, (bytes, str)):
+                part.close()
+        self._parts = []
+
+
+class ApiClient:
+    """Backend calls on a thread pool over one keep-alive session
+
+    Callbacks run on the Kivy main thread via Clock. Requests sharing a
+    channel supersede each other: starting one cancels the previous, so a
+    stale search can't overwrite a newer one.
+    """
+
+    def __init__(self, base_url=BASE_URL, max_workers=MAX_WORKERS):
+        self.base_url = base_url
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._channels = {}  # channel -> latest ApiRequest
+        self._lock = threading.Lock()
+
+    def get(self, path, on_done=None, on_error=None, channel=None, **kwargs):
+        return self.request('GET', path, on_done, on_error, channel, **kwargs)
+
+    def post(self, path, on_done=None, on_error=None, channel=None, **kwargs):
+        return self.request('POST', path, on_done, on_error, channel, **kwargs)
+
+    def request(self, method, path, on_done=None, on_error=None, channel=None, parse=None,
+                cleanup=None, **kwargs):
+        """Send a request in the background
+
+        on_done gets any HTTP response, or parse(response) when parse is
+        given; parse runs on the worker thread, so decoding doesn't block the
+        UI. on_error(exception) gets connection failures and anything parse
+        raises. Neither runs once the request is cancelled. cleanup() runs on
+        the worker once the request is over, sent or not.
+        """
+        handle = ApiRequest(channel, cleanup)
+        if channel is not None:
+            with self._lock:
+                previous = self._channels.get(channel)
+                self._channels[channel] = handle
+            if previous is not None:
+                previous.cancel()
+
+        def run():
+            try:
+                if handle.cancelled:
+                    return
+                response = self.session.request(method, self.base_url + path, **kwargs)
+                value = parse(response) if parse else response
+            except Exception as e:
+                self._deliver(handle, on_error, e)
+                return
+            finally:
+                if cleanup:
+                    cleanup()
+            self._deliver(handle, on_done, value)
+
+        handle.future = self._executor.submit(run)
+        return handle
+
+    def upload(self, path, files, fields=None, on_done=None, on_error=None,
+               on_progress=None, channel=None, parse=None):
+        """POST files [(field, filepath), ...] as multipart, streaming them from disk
+
+        on_progress(sent, total) is called on the main thread at most every
+        PROGRESS_INTERVAL seconds while the body is sent. The files are
+        closed once the request is over, including when it was cancelled.
+        """
+        last = [0.0]
+
+        def on_read(sent, total):
+            now = Clock.get_boottime()
+            if on_progress and (now - last[0] >= PROGRESS_INTERVAL or sent == total):
+                last[0] = now
+                Clock.schedule_once(lambda dt: on_progress(sent, total), 0)
+
+        body = MultipartBody(fields, files, on_read)
+        return self.request('POST', path, on_done, on_error, channel, parse=parse,
+                            cleanup=body.close, data=body,
+                            headers={'Content-Type': body.content_type})
+
+    def cancel(self, channel):
+        with self._lock:
+            handle = self._channels.pop(channel, None)
+        if handle is not None:
+            handle.cancel()
+
+    def close(self):
+        """Cancel outstanding requests and release pooled connections"""
+        with self._lock:
+            handles = list(self._channels.values())
+            self._channels.clear()
+        for handle in handles:
+            handle.cancel()
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+    def _deliver(self, handle, callback, value):
+        def call(dt):
+            # Checked on the main thread, so a cancel always wins
+            if handle.cancelled:
+                return
+            if handle.channel is not None:
+                with self._lock:
+                    if self._channels.get(handle.channel) is handle:
+                        del self._channels[handle.channel]
+            if callback:
+                callback(value)
+        Clock.schedule_once(call, 0)
@@ -7,9 +7,9 @@ from kivy.uix.popup import Popup
 from kivy.uix.image import AsyncImage
 from kivy.uix.textinput import TextInput
 from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.uix.gridlayout import GridLayout
 from kivy.uix.scrollview import ScrollView
-import requests
 import json
 import os
 from kivy.lang import Builder
@@ -22,8 +22,10 @@ from kivy.animation import Animation
 from kivy.utils import get_color_from_hex
 from kivy.uix.behaviors import ButtonBehavior
 from kivy.uix.image import Image
+from kivy.properties import NumericProperty
 import pandas as pd
 from datetime import datetime
+from api_client import ApiClient, BASE_URL, PAGE_ACCEPT, decode_json, decode_page
 
 # Load the KV file
 Builder.load_file("design.kv")
@@ -36,6 +38,30 @@ SUCCESS_COLOR = '#2ECC71'
 ERROR_COLOR = '#E74C3C'
 BUTTON_BG = '#4A90E2'
 
+# Rows requested per /get_data page
+PAGE_SIZE = 200
+
+# Seconds the server may hold a /jobs request open
+JOB_POLL_WAIT = 10
+
+# Seconds of typing pause before a live search is sent
+SEARCH_DEBOUNCE = 0.3
+
+IMAGE_ENDPOINT = BASE_URL + '/get_image/'
+
+# Backend calls run off the UI thread, over one keep-alive session
+api = ApiClient(BASE_URL)
+
+def image_source(image_url):
+    """URL for a table image, asking our backend for a cell-sized thumbnail"""
+    image_url = str(image_url)
+    if not image_url.startswith(('http://', 'https://')):
+        image_url = IMAGE_ENDPOINT + image_url
+    if image_url.startswith(IMAGE_ENDPOINT) and '?' not in image_url:
+        size = int(dp(100))
+        image_url += f'?w={size}&h={size}'
+    return image_url
+
 class AnimatedButton(ButtonBehavior, Image):
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -98,7 +124,8 @@ class ImageUploadPopup(ModalView):
         # File chooser
         self.file_chooser = FileChooserIconView(
             size_hint_y=0.7,
-            filters=['*.png', '*.jpg', '*.jpeg', '*.gif']
+            filters=['*.png', '*.jpg', '*.jpeg', '*.gif'],
+            multiselect=True
         )
         layout.add_widget(self.file_chooser)
         
@@ -113,7 +140,7 @@ class ImageUploadPopup(ModalView):
         buttons.add_widget(cancel_btn)
         
         upload_btn = Button(
-            text='Upload Image',
+            text='Upload Images',
             size_hint_x=0.5,
             background_color=(0.2, 0.7, 0.3, 1),
             on_press=self.upload_image
@@ -132,21 +159,26 @@ class ImageUploadPopup(ModalView):
             ).open()
             return
         
-        image_path = self.file_chooser.selection[0]
-        files = {'image': open(image_path, 'rb')}
-        data = {'file_id': self.file_id}
+        # All selected images go up in one request; images named after a
+        # row number (e.g. 12.jpg) are bound to that row
+        image_paths = self.file_chooser.selection
+        manifest = {}
+        for path in image_paths:
+            stem = os.path.splitext(os.path.basename(path))[0]
+            if stem.isdigit():
+                manifest[os.path.basename(path)] = int(stem)
+        fields = {'file_id': self.file_id, 'manifest': json.dumps(manifest)}
         
-        try:
-            response = requests.post(
-                'http://127.0.0.1:5000/upload_image',
-                files=files,
-                data=data
-            )
-            
-            if response.status_code == 200:
+        def done(reply):
+            status, result = reply
+            if status == 200:
+                failed = [r for r in result['results'] if r['status'] != 'saved']
+                message = result['message']
+                if failed:
+                    message += '\n' + '\n'.join(f"{r['filename']}: {r['error']}" for r in failed[:5])
                 Popup(
-                    title='Success',
-                    content=Label(text='Image uploaded successfully'),
+                    title='Success' if not failed else 'Partially uploaded',
+                    content=Label(text=message),
                     size_hint=(0.6, 0.4)
                 ).open()
                 self.dismiss()
@@ -155,15 +187,19 @@ class ImageUploadPopup(ModalView):
             else:
                 Popup(
                     title='Error',
-                    content=Label(text=f'Upload failed: {response.json().get("error", "")}'),
+                    content=Label(text=f'Upload failed: {result.get("error", "")}'),
                     size_hint=(0.6, 0.4)
                 ).open()
-        except Exception as e:
+        
+        def error(e):
             Popup(
                 title='Error',
                 content=Label(text=f'Connection error: {str(e)}'),
                 size_hint=(0.6, 0.4)
             ).open()
+        
+        api.upload('/upload_images', [('images', path) for path in image_paths],
+                   fields=fields, on_done=done, on_error=error, parse=decode_json)
 
 class DataCell(BoxLayout):
     def __init__(self, text='', is_header=False):
@@ -184,12 +220,13 @@ class DataCell(BoxLayout):
             )
         
         # Add label
-        self.add_widget(Label(
+        self.label = Label(
             text=str(text),
             bold=is_header,
             color=get_color_from_hex('#FFFFFF' if is_header else '#B3B3B3'),
             font_size=dp(14) if is_header else dp(12)
-        ))
+        )
+        self.add_widget(self.label)
         
         self.bind(size=self._update_rect, pos=self._update_rect)
     
@@ -198,6 +235,9 @@ class DataCell(BoxLayout):
         self.rect.size = self.size
         self.border.pos = (self.pos[0] + 1, self.pos[1] + 1)
         self.border.size = (self.size[0] - 2, self.size[1] - 2)
+    
+    def update(self, value):
+        self.label.text = str(value)
 
 class ImageCell(BoxLayout):
     def __init__(self, image_url):
@@ -209,15 +249,17 @@ class ImageCell(BoxLayout):
         image_container = BoxLayout(orientation='vertical', padding=dp(5))
         
         # Add image
-        image = AsyncImage(
-            source=image_url if image_url.startswith(('http://', 'https://')) 
-                   else f'http://127.0.0.1:5000/get_image/{image_url}',
+        self.image = AsyncImage(
+            source=image_source(image_url) if image_url else '',
             size_hint_y=1,
             allow_stretch=True,
             keep_ratio=True
         )
-        image_container.add_widget(image)
+        image_container.add_widget(self.image)
         self.add_widget(image_container)
+    
+    def update(self, image_url):
+        self.image.source = image_source(image_url) if image_url else ''
 
 class TableRow(BoxLayout):
     def __init__(self, is_header=False):
@@ -238,10 +280,89 @@ class TableRow(BoxLayout):
         self.rect.pos = self.pos
         self.rect.size = self.size
 
+class RecycledRow(RecycleDataViewBehavior, TableRow):
+    """A table row whose cells are reused for whichever record scrolls into view"""
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.headers = None
+        self.cells = []
+    
+    def refresh_view_attrs(self, rv, index, data):
+        if self.headers != rv.headers:
+            self.build_cells(rv.headers)
+        row = data.get('row')
+        if row is None:
+            # Not fetched yet, show an empty row until its page arrives
+            rv.request_page(index)
+            row = {}
+        for key, cell in zip(self.headers, self.cells):
+            cell.update(row.get(key, ''))
+    
+    def build_cells(self, headers):
+        self.clear_widgets()
+        self.headers = list(headers)
+        self.cells = []
+        for key in self.headers:
+            cell = ImageCell('') if key == 'image_url' else DataCell()
+            cell.size_hint_x = 1 / len(self.headers)
+            self.cells.append(cell)
+            self.add_widget(cell)
+
+class DataTable(RecycleView):
+    """Virtualized table: only rows in view get widgets, pages load as they scroll in
+
+    Rows not fetched yet share one placeholder item, so a table of any length
+    costs a list of references until it is scrolled through.
+    """
+    table_width = NumericProperty(800)
+    
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.headers = []
+        self.load_page = None
+        self.requested_pages = set()
+        self._loading = {}  # page -> request in flight
+    
+    def show(self, headers, rows, total=None, load_page=None):
+        """Display rows, the first of total, fetching the rest via load_page(offset, on_rows)"""
+        self.cancel_loads()
+        self.headers = list(headers)
+        self.load_page = load_page
+        self.requested_pages = set(range(-(-len(rows) // PAGE_SIZE)))
+        self.table_width = max(len(headers) * dp(150), Window.width - dp(40))
+        
+        total = len(rows) if total is None else total
+        placeholder = {'row': None}
+        self.data = [{'row': row} for row in rows] + [placeholder] * (total - len(rows))
+        self.scroll_y = 1
+    
+    def request_page(self, index):
+        page = index // PAGE_SIZE
+        if self.load_page is None or page in self.requested_pages:
+            return
+        self.requested_pages.add(page)
+        load_page = self.load_page
+        
+        def loaded(rows):
+            self._loading.pop(page, None)
+            # A failed page stays requested, so it isn't retried on every frame
+            if rows is None or load_page is not self.load_page:
+                return
+            start = page * PAGE_SIZE
+            self.data[start:start + len(rows)] = [{'row': row} for row in rows]
+        
+        self._loading[page] = load_page(page * PAGE_SIZE, loaded)
+    
+    def cancel_loads(self):
+        for request in self._loading.values():
+            request.cancel()
+        self._loading = {}
+
 class FileUploader(BoxLayout):
     def __init__(self):
         super().__init__()
         self.current_file_id = None
+        self._search_event = None
         self.setup_search()
     
     def setup_search(self):
@@ -255,6 +376,21 @@ class FileUploader(BoxLayout):
         """Called when text changes in the search input"""
         instance.foreground_color = [1, 1, 1, 1]  # White text
         instance.hint_text_color = [0.5, 0.5, 0.5, 1]  # Gray hint text
+        
+        # Search live once typing pauses
+        if self._search_event is not None:
+            self._search_event.cancel()
+        if self.current_file_id:
+            self._search_event = Clock.schedule_once(self.live_search, SEARCH_DEBOUNCE)
+    
+    def live_search(self, dt):
+        self._search_event = None
+        if self.ids.search_input.text.strip():
+            self.search_data(live=True)
+        else:
+            # Cleared search box, back to the whole dataset
+            self.ids.result_label.text = ''
+            self.fetch_data(self.current_file_id)
     
     def upload_file(self):
         if not self.ids.file_chooser.selection:
@@ -266,80 +402,164 @@ class FileUploader(BoxLayout):
             self.show_error_popup("Please select a CSV or Excel file")
             return
         
-        try:
-            with open(file_path, 'rb') as file:
-                response = requests.post('http://127.0.0.1:5000/upload', files={'file': file})
-            
-            if response.status_code == 200:
+        def done(reply):
+            status, body = reply
+            self.hide_progress()
+            if status == 200:
                 self.show_success_popup("File uploaded successfully!")
-                self.process_file(response.json()['filename'])
+                self.process_file(body['filename'])
                 self.enable_search()
             else:
-                self.show_error_popup(f"Error uploading file: {response.text}")
-        except Exception as e:
+                self.show_error_popup(f"Error uploading file: {body.get('error', '')}")
+        
+        def error(e):
+            self.hide_progress()
             self.show_error_popup(f"Error: {str(e)}")
+        
+        self.show_progress(0, 1)
+        api.upload('/upload', [('file', file_path)], on_done=done, on_error=error,
+                   on_progress=self.show_progress, channel='upload', parse=decode_json)
+    
+    def show_progress(self, sent, total):
+        """Show how much of an upload has been sent"""
+        percent = int(sent * 100 / total) if total else 100
+        self.ids.upload_progress.opacity = 1
+        self.ids.upload_progress.value = percent
+        self.ids.result_label.text = f'Uploading... {percent}%'
+    
+    def hide_progress(self):
+        self.ids.upload_progress.opacity = 0
+        self.ids.result_label.text = ''
     
     def enable_search(self):
         self.ids.search_input.disabled = False
         self.ids.search_button.disabled = False
     
     def process_file(self, filename):
-        try:
-            response = requests.post('http://127.0.0.1:5000/process', json={'filename': filename})
-            if response.status_code == 200:
-                self.current_file_id = response.json()['file_id']
-                self.fetch_data(self.current_file_id)
+        def done(reply):
+            status, body = reply
+            if status == 200:
+                self.on_processed(body)
+            elif status == 202:
+                # Parsing was queued on the server, wait for the job to finish
+                self.watch_job(body['job_id'])
             else:
-                self.show_error_popup(f'File processing failed: {response.json().get("error", "")}')
-        except Exception as e:
-            self.show_error_popup(f'Connection error: {str(e)}')
+                self.show_error_popup(f'File processing failed: {body.get("error", "")}')
+        
+        api.post('/process', done, self.show_connection_error, channel='process',
+                 parse=decode_json, json={'filename': filename})
     
-    def fetch_data(self, file_id):
-        try:
-            response = requests.get(f'http://127.0.0.1:5000/get_data/{file_id}')
-            if response.status_code == 200:
-                self.display_data(response.json()['data'])
+    def on_processed(self, result):
+        if 'file_id' not in result:
+            self.show_error_popup(result.get('message', 'Nothing to display'))
+            return
+        self.current_file_id = result['file_id']
+        self.fetch_data(self.current_file_id)
+        if not result.get('complete', True):
+            self.watch_ingest(self.current_file_id)
+    
+    def watch_job(self, job_id):
+        """Long poll a queued /process job and show the dataset once it is ready"""
+        self.ids.result_label.text = 'Processing...'
+        
+        def done(reply):
+            status, body = reply
+            if status == 202:
+                check()
+                return
+            self.ids.result_label.text = ''
+            if status == 200:
+                self.on_processed(body)
+            else:
+                self.show_error_popup(f'File processing failed: {body.get("error", "")}')
+        
+        def error(e):
+            self.ids.result_label.text = ''
+            self.show_connection_error(e)
+        
+        def check():
+            api.get(f'/jobs/{job_id}', done, error, channel='process', parse=decode_json,
+                    params={'wait': JOB_POLL_WAIT})
+        
+        check()
+    
+    def watch_ingest(self, file_id):
+        """Poll a chunked ingest and reload the table once every row is in"""
+        def done(reply):
+            if file_id != self.current_file_id:
+                return
+            status = reply[1]
+            self.ids.result_label.text = f"Loading... {status.get('rows', 0)} rows"
+            if not status.get('done'):
+                Clock.schedule_once(check, 1)
+                return
+            self.ids.result_label.text = ''
+            if status.get('error'):
+                self.show_error_popup(status['error'])
             else:
-                self.show_error_popup(f'Failed to fetch data: {response.json().get("error", "")}')
-        except Exception as e:
-            self.show_error_popup(f'Connection error: {str(e)}')
+                self.fetch_data(file_id)
+        
+        def check(dt):
+            if file_id != self.current_file_id:
+                return
+            api.get(f'/process_status/{file_id}', done, lambda e: Clock.schedule_once(check, 1),
+                    channel='ingest', parse=decode_json)
+        
+        Clock.schedule_once(check, 1)
     
-    def display_data(self, data):
-        # Setup table
-        table = self.ids.table_layout
-        table.clear_widgets()
+    def fetch_data(self, file_id):
+        def first_page(page):
+            if page is None or file_id != self.current_file_id:
+                return
+            
+            def load_page(offset, on_rows):
+                return self.fetch_page(file_id, offset,
+                                       lambda page: on_rows(page['data'] if page else None))
+            
+            self.display_data(page['data'], total=page.get('total'), load_page=load_page)
+        
+        self.fetch_page(file_id, 0, first_page, channel='data')
+    
+    def fetch_page(self, file_id, offset, on_page, channel=None):
+        """Request a /get_data page, on_page gets its JSON or None after an error"""
+        def done(reply):
+            status, page = reply
+            if status == 200:
+                on_page(page)
+                return
+            self.show_error_popup(f'Failed to fetch data: {page.get("error", "")}')
+            on_page(None)
+        
+        def error(e):
+            self.show_connection_error(e)
+            on_page(None)
+        
+        return api.get(f'/get_data/{file_id}', done, error, channel=channel,
+                       parse=decode_page('data'), params={'offset': offset, 'limit': PAGE_SIZE},
+                       headers={'Accept': PAGE_ACCEPT})
+    
+    def display_data(self, data, total=None, load_page=None):
+        table = self.ids.table_view
+        header = self.ids.table_header
+        header.clear_widgets()
         
         if not data:
+            table.show([], [])
             return
         
         headers = list(data[0].keys())
-        table.width = max(len(headers) * dp(150), Window.width - dp(40))
+        table.show(headers, data, total=total, load_page=load_page)
         
         # Add header row
         header_row = TableRow(is_header=True)
-        header_row.width = table.width
-        for header in headers:
-            cell = DataCell(text=header, is_header=True)
+        header_row.size_hint_x = 1
+        for key in headers:
+            cell = DataCell(text=key, is_header=True)
             cell.size_hint_x = 1 / len(headers)
             header_row.add_widget(cell)
-        table.add_widget(header_row)
-        
-        # Add data rows with animation
-        for i, item in enumerate(data):
-            row = TableRow()
-            row.width = table.width
-            
-            for key in headers:
-                cell = (ImageCell(item.get(key, '')) if key == 'image_url' 
-                       else DataCell(text=item.get(key, '')))
-                cell.size_hint_x = 1 / len(headers)
-                row.add_widget(cell)
-            
-            table.add_widget(row)
-            anim = Animation(opacity=1, duration=0.3)
-            Clock.schedule_once(lambda dt, r=row: anim.start(r), i * 0.05)
+        header.add_widget(header_row)
     
-    def search_data(self, instance=None):
+    def search_data(self, instance=None, live=False):
         if not self.current_file_id:
             self.show_error_popup("Please upload a file first")
             return
@@ -349,19 +569,40 @@ class FileUploader(BoxLayout):
             self.show_error_popup("Please enter a search query")
             return
         
-        try:
-            response = requests.post('http://127.0.0.1:5000/search', 
-                                  json={'file_id': self.current_file_id, 'query': query})
-            if response.status_code == 200:
-                results = response.json()['results']
-                if not results:
-                    self.show_error_popup("No results found")
+        file_id = self.current_file_id
+        
+        def load_page(offset, on_rows):
+            def done(reply):
+                status, page = reply
+                on_rows(page['results'] if status == 200 else None)
+            return api.post('/search', done, lambda e: on_rows(None),
+                            parse=decode_page('results'), headers={'Accept': PAGE_ACCEPT},
+                            json={'file_id': file_id, 'query': query,
+                                  'offset': offset, 'limit': PAGE_SIZE})
+        
+        def done(reply):
+            status, page = reply
+            if status == 200:
+                if not page['results']:
+                    if live:
+                        self.display_data([])
+                        self.ids.result_label.text = 'No results found'
+                    else:
+                        self.show_error_popup("No results found")
                     return
-                self.display_data(results)
+                self.ids.result_label.text = f"{page.get('total', len(page['results']))} results"
+                self.display_data(page['results'], total=page.get('total'), load_page=load_page)
             else:
-                self.show_error_popup(f"Error searching data: {response.text}")
-        except Exception as e:
-            self.show_error_popup(f"Error: {str(e)}")
+                self.show_error_popup(f"Error searching data: {page.get('error', '')}")
+        
+        # Shares the table's channel, so whichever was asked for last is shown,
+        # and results come a page at a time like the full table
+        api.post('/search', done, lambda e: self.show_error_popup(f"Error: {str(e)}"),
+                 channel='data', parse=decode_page('results'), headers={'Accept': PAGE_ACCEPT},
+                 json={'file_id': file_id, 'query': query, 'offset': 0, 'limit': PAGE_SIZE})
+    
+    def show_connection_error(self, e):
+        self.show_error_popup(f'Connection error: {str(e)}')
     
     def show_error_popup(self, message):
         ModernPopup(title='Error', message=message, is_error=True).open()
@@ -374,6 +615,9 @@ class DataApp(App):
         Window.size = (1200, 800)
         Window.clearcolor = get_color_from_hex(DARK_BG)
         return FileUploader()
+    
+    def on_stop(self):
+        api.close()
 
 if __name__ == '__main__':
     DataApp().run()
\ No newline at end of file